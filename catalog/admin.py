@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product
+from .models import Category, CategoryStats, Product
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -11,3 +11,9 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'category')  # id, name, price, category
     list_filter = ('category',)  # фильтрация по категории
     search_fields = ('name', 'description')  # поиск по name и description
+
+
+@admin.register(CategoryStats)
+class CategoryStatsAdmin(admin.ModelAdmin):
+    list_display = ('category', 'published_count', 'min_price', 'max_price', 'updated_at')
+    readonly_fields = ('category', 'published_count', 'price_sum', 'min_price', 'max_price', 'updated_at')
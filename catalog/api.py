@@ -0,0 +1,154 @@
+"""
+JSON API каталога только для чтения: продукты и категории.
+
+Данные берутся из CatalogCache. Список продуктов отдается потоком
+(StreamingHttpResponse): ключи сортировки читаются серверным курсором
+(iterator), карточки - пачками через get_products_info, поэтому память
+не зависит от размера страницы.
+"""
+import json
+from typing import Dict, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .cache import CatalogCache
+from .models import Category, Product
+from .pagination import InvalidCursor, KeysetPaginator, ORDERINGS
+
+# Лимиты API (элементов на страницу, ID в пакетном запросе, размер пачки курсора)
+API_SETTINGS = getattr(settings, 'CATALOG_API', {})
+DEFAULT_LIMIT = API_SETTINGS.get('DEFAULT_LIMIT', 50)
+MAX_LIMIT = API_SETTINGS.get('MAX_LIMIT', 1000)
+MAX_IDS = API_SETTINGS.get('MAX_IDS', 200)
+CHUNK_SIZE = API_SETTINGS.get('CHUNK_SIZE', 500)
+
+
+def _error(message: str, status: int = 400) -> JsonResponse:
+    return JsonResponse({'error': message}, status=status)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def product_data(product) -> Dict:
+    """
+    Продукт (ProductRow) -> словарь для JSON. В списках description -
+    начало описания из карточки, полное - в /api/products/<id>/.
+    """
+    category = product.category
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'description': product.description,
+        'image': product.image.url if product.image else None,
+        'category': {'id': category.id, 'name': category.name, 'slug': category.slug} if category.id else None,
+        'created_at': product.created_at,
+        'updated_at': product.updated_at,
+        'url': product.get_absolute_url(),
+    }
+
+
+def _stream_products(paginator: KeysetPaginator, cursor: str) -> Iterator[str]:
+    """Тело ответа списка по частям: элементы пачками, курсор - в конце"""
+    rows = paginator.iter_rows(cursor, chunk_size=CHUNK_SIZE)
+    key_index = paginator.fields.index('id')
+    yield '{"results":['
+
+    separator, chunk, sent, last, has_next = '', [], 0, None, False
+    for row in rows:
+        if sent == paginator.per_page:
+            # Строка сверх лимита - страница не последняя
+            has_next = True
+            break
+        chunk.append(row[key_index])
+        sent, last = sent + 1, row
+        if len(chunk) == CHUNK_SIZE or sent == paginator.per_page:
+            # Одна пачка карточек - один get_many по кэшу
+            for product in CatalogCache.get_products_info(chunk):
+                yield separator + _dumps(product_data(product))
+                separator = ','
+            chunk = []
+    for product in CatalogCache.get_products_info(chunk):
+        yield separator + _dumps(product_data(product))
+        separator = ','
+
+    next_cursor = paginator.encode_cursor(last, 'n') if has_next else None
+    yield '],"next":' + _dumps(next_cursor) + '}'
+
+
+@require_GET
+def products(request):
+    """
+    Список продуктов: ?category=<slug>&sort=new|price|-price&limit=&cursor=
+    или пакетный запрос ?ids=1,2,3 (порядок сохраняется).
+    """
+    if 'ids' in request.GET:
+        try:
+            ids = [int(pk) for pk in request.GET['ids'].split(',') if pk.strip()]
+        except ValueError:
+            return _error('ids: ожидается список чисел через запятую')
+        if len(ids) > MAX_IDS:
+            return _error(f'ids: не больше {MAX_IDS} за запрос')
+        return JsonResponse({
+            'results': [product_data(product) for product in CatalogCache.get_products_info(ids)],
+        })
+
+    sort = request.GET.get('sort') or 'new'
+    if sort not in ORDERINGS:
+        return _error(f'sort: одно из {", ".join(ORDERINGS)}')
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        return _error('limit: ожидается число')
+
+    queryset = Product.objects.filter(is_published=True)
+    slug = request.GET.get('category')
+    if slug:
+        category_id = Category.objects.filter(slug=slug).values_list('id', flat=True).first()
+        if category_id is None:
+            return _error('category: категория не найдена', status=404)
+        queryset = queryset.filter(category_id=category_id)
+
+    paginator = KeysetPaginator(queryset, limit, ORDERINGS[sort])
+    try:
+        body = _stream_products(paginator, request.GET.get('cursor'))
+        # Первая часть вычисляется сразу: битый курсор - это 400, а не оборванный поток
+        head = next(body)
+    except InvalidCursor:
+        return _error('cursor: неверный курсор')
+
+    def stream():
+        yield head
+        yield from body
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+@require_GET
+def product(request, pk):
+    """Продукт с полным описанием"""
+    info = CatalogCache.get_product_info(pk)
+    if info is None:
+        return _error('Продукт не найден', status=404)
+    return JsonResponse(product_data(info))
+
+
+@require_GET
+def categories(request):
+    """Все категории"""
+    return JsonResponse({
+        'results': [
+            {
+                'id': category.id,
+                'name': category.name,
+                'slug': category.slug,
+                'description': category.description,
+            }
+            for category in CatalogCache.get_categories()
+        ],
+    })
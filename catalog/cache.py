@@ -1,9 +1,301 @@
+import functools
 import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar, Token
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, Callable
+from django.conf import settings
 from django.core.cache import cache
-from django.db.models import QuerySet, Count, Avg, Max, Min, Q
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.db.models import QuerySet
+from django.db.models.functions import Left
+from .cache_serializer import (
+    CacheSerializer, to_cents, from_cents, to_micros, from_micros,
+    to_decimal_str, from_decimal_str,
+)
 from .models import Product, Category
+from . import stats_snapshot
+from .search import get_search_backend
+
+logger = logging.getLogger(__name__)
+
+# Создание L1 и запуск потока-слушателя - один раз на процесс
+_l1_init_lock = threading.Lock()
+
+# Мемоизация в пределах запроса: словарь вызовов текущего запроса.
+# ContextVar отделяет запросы и в потоках WSGI, и в задачах ASGI;
+# вне запроса (команды, shell) значение None и мемоизации нет
+_request_memo: ContextVar[Optional[dict]] = ContextVar('catalog_request_memo', default=None)
+
+
+def start_request_memo() -> Token:
+    """Начать мемоизацию вызовов CatalogCache (см. CatalogCacheMemoMiddleware)"""
+    return _request_memo.set({})
+
+
+def end_request_memo(token: Token):
+    _request_memo.reset(token)
+
+
+def request_memoized(method: Callable) -> Callable:
+    """Одинаковые вызовы метода в одном запросе возвращают первый результат"""
+    @functools.wraps(method)
+    def wrapper(cls, *args, **kwargs):
+        memo = _request_memo.get()
+        if memo is None:
+            return method(cls, *args, **kwargs)
+        key = (method.__name__,
+               tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+               tuple(sorted(kwargs.items())))
+        try:
+            return memo[key]
+        except KeyError:
+            result = memo[key] = method(cls, *args, **kwargs)
+            return result
+        except TypeError:
+            # Нехэшируемые аргументы - без мемоизации
+            return method(cls, *args, **kwargs)
+    return wrapper
+
+
+class LocalCache:
+    """Процессный LRU-кэш с TTL и ограничением размера (уровень L1)"""
+
+    def __init__(self, max_size: int = 256, ttl: int = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'size': len(self._data),
+            'evictions': self.evictions,
+        }
+
+
+class _ImageRef:
+    """Минимальная замена ImageFieldFile для шаблонов ({{ product.image.url }})"""
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name or ''
+
+    @property
+    def url(self) -> str:
+        return default_storage.url(self.name)
+
+
+class _Ref:
+    """Связанный объект (категория/владелец) из кэшированной строки"""
+    __slots__ = ('id', 'name', 'slug', 'email')
+
+    def __init__(self, id, name=None, slug=None, email=None):
+        self.id = id
+        self.name = name
+        self.slug = slug
+        self.email = email
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def username(self):
+        # У модели User логином служит email
+        return self.email
+
+    def __eq__(self, other):
+        # Позволяет писать в шаблонах {% if user == product.owner %}
+        return self.id is not None and getattr(other, 'pk', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.name or self.email or ''
+
+
+class ProductRow:
+    """
+    Компактное представление продукта из кэша.
+
+    Содержит только поля, которые используют шаблоны списков,
+    поэтому попадание в кэш не требует запросов к БД. Хранит кортеж
+    колонок как есть и разбирает поля только при обращении к ним.
+    """
+    # Порядок колонок карточки списка: вместо полного описания - его начало,
+    # усеченное в SQL (card_description, см. card_values)
+    FIELDS = (
+        'id', 'name', 'price', 'card_description', 'image', 'created_at',
+        'is_published', 'category_id', 'category__name', 'category__slug',
+        'owner_id', 'owner__email', 'updated_at',
+    )
+    # Страница продукта: полное описание
+    DETAIL_FIELDS = FIELDS[:3] + ('description',) + FIELDS[4:]
+    # Поля для only(), когда спискам нужны объекты Product (режим 'ids'):
+    # без search_vector и полной строки владельца
+    CARD_ONLY = (
+        'id', 'name', 'price', 'description', 'image', 'created_at',
+        'is_published', 'category__name', 'category__slug', 'owner__email', 'updated_at',
+    )
+    # Шаблоны списков режут описание до 100 символов (truncatechars);
+    # лишний символ сохраняет многоточие у длинных описаний
+    CARD_DESCRIPTION_LENGTH = 101
+    __slots__ = ('_row',)
+
+    def __init__(self, row: tuple):
+        self._row = row
+
+    @staticmethod
+    def pack(row: tuple) -> tuple:
+        """Строка values_list -> кортеж простых значений для кэша"""
+        row = list(row)
+        row[2] = to_cents(row[2])
+        row[5] = to_micros(row[5])
+        row[12] = to_micros(row[12])
+        return tuple(row)
+
+    @classmethod
+    def card_values(cls, queryset: QuerySet) -> QuerySet:
+        """Строки карточек (FIELDS) без полного текста описания"""
+        return queryset.annotate(
+            card_description=Left('description', cls.CARD_DESCRIPTION_LENGTH),
+        ).values_list(*cls.FIELDS)
+
+    @classmethod
+    def card_objects(cls, queryset: QuerySet) -> QuerySet:
+        """Объекты Product только с полями карточки"""
+        return queryset.select_related('category', 'owner').only(*cls.CARD_ONLY)
+
+    @property
+    def id(self):
+        return self._row[0]
+
+    pk = id
+
+    @property
+    def name(self):
+        return self._row[1]
+
+    @property
+    def price(self):
+        return from_cents(self._row[2])
+
+    @property
+    def description(self):
+        return self._row[3]
+
+    @property
+    def image(self):
+        return _ImageRef(self._row[4])
+
+    @property
+    def created_at(self):
+        return from_micros(self._row[5])
+
+    @property
+    def updated_at(self):
+        return from_micros(self._row[12])
+
+    @property
+    def is_published(self):
+        return self._row[6]
+
+    @property
+    def category(self):
+        return _Ref(self._row[7], name=self._row[8], slug=self._row[9])
+
+    @property
+    def category_id(self):
+        return self._row[7]
+
+    @property
+    def owner(self):
+        return _Ref(self._row[10], email=self._row[11]) if self._row[10] else None
+
+    @property
+    def owner_id(self):
+        return self._row[10]
+
+    def get_absolute_url(self):
+        from django.urls import reverse
+        return reverse('catalog:product_detail', kwargs={'pk': self.id})
+
+    def is_owner(self, user):
+        return self.owner == user
+
+    def __str__(self):
+        return f"{self.name} ({self.price} руб.)"
+
+
+class CategoryRow:
+    """Компактное представление категории из кэша"""
+    FIELDS = ('id', 'name', 'slug', 'description')
+    __slots__ = ('id', 'name', 'slug', 'description', 'count')
+
+    def __init__(self, row: tuple):
+        self.id, self.name, self.slug, self.description = row[:4]
+        # Количество продуктов (есть только в статистике)
+        self.count = row[4] if len(row) > 4 else None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
 
 
 class CatalogCache:
@@ -17,21 +309,311 @@ class CatalogCache:
         'category_detail': ('category:detail:{slug}', 3600),
         'product_stats': ('products:stats', 1800),
         'product_detail': ('product:detail:{id}', 600),
+        'product_card': ('product:card:{id}', 600),
+        # HTML-фрагменты карточек (catalog/fragments.py)
+        'card_html': ('card:html:{id}', getattr(settings, 'CATALOG_CARD_CACHE_TTL', 3600)),
+        'suggestions': ('suggest:{digest}', 300),
+        'facets': ('facets:{digest}', 300),
+        'pages': ('page:{digest}', 300),
+    }
+
+    # Пространство имен (счетчик поколений), от которого зависит семейство ключей.
+    # Инвалидация пространства - это один INCR его поколения: старые ключи
+    # просто перестают читаться и истекают по TTL.
+    NAMESPACES = {
+        'products_all': 'catalog',
+        'products_category': 'category:{slug}',
+        'categories_all': 'catalog',
+        'category_detail': 'category:{slug}',
+        # Статистика берется из снимка; сбрасывается командой refresh_catalog_stats
+        'product_stats': 'stats',
+        'product_detail': 'product:{id}',
+        'product_card': 'product:{id}',
+        # Переименование категории и смена email владельца тоже
+        # сбрасывают пространства их продуктов (см. signals)
+        'card_html': 'product:{id}',
+        'suggestions': 'catalog',
+        'facets': 'catalog',
+        # Готовые страницы зависят от нескольких пространств (см. page_cache);
+        # здесь - основное, для учета вытеснений
+        'pages': 'catalog',
     }
+    # Общее поколение всех ключей каталога (увеличивается в clear())
+    ROOT_NAMESPACE = 'epoch'
+    # Срок жизни счетчиков поколений: должен быть намного больше любого TTL
+    GENERATION_TTL = 7 * 24 * 3600
+
+    # Классы строк для режима 'rows'
+    ROW_CLASSES = {
+        Product: ProductRow,
+        Category: CategoryRow,
+    }
+
+    # Сколько секунд после истечения TTL можно отдавать устаревшее значение,
+    # пока один воркер пересчитывает новое (stale-while-revalidate)
+    STALE_TTL = getattr(settings, 'CATALOG_CACHE_STALE_TTL', 300)
+    # Время жизни блокировки пересчета и ожидание чужого пересчета при промахе
+    LOCK_TTL = 30
+    LOCK_WAIT = 2.0
+    # Коэффициент вероятностного раннего обновления (0 - выключено)
+    EARLY_REFRESH_BETA = getattr(settings, 'CATALOG_CACHE_EARLY_REFRESH_BETA', 0)
+
+    # Настройки процессного кэша L1 (None - выключен)
+    L1_SETTINGS = getattr(settings, 'CATALOG_CACHE_L1', None)
+    _l1 = None
+    _l1_generations = None
+    _listener_pid = None
+
+    # Сериализатор значений: простые структуры, сжатие больших значений.
+    # Схема строк входит в заголовок - при изменении колонок старые записи
+    # читаются как промахи
+    serializer = CacheSerializer(
+        schema=repr((ProductRow.FIELDS, ProductRow.DETAIL_FIELDS, CategoryRow.FIELDS)),
+        compress_threshold=getattr(settings, 'CATALOG_CACHE_COMPRESS_THRESHOLD', 1024),
+    )
+
+    # Отметка "продукта нет" - отрицательный результат тоже кэшируется
+    NOT_FOUND = 'catalog:not-found'
+
+    # Пути, по которым проходит чтение (для метрик)
+    PATHS = ('hit', 'miss', 'stale', 'refresh', 'early', 'wait')
+    # Все счетчики семейства: пути чтения, время пересчета (мкс),
+    # объем записанных значений и вытеснения сменой поколения
+    STATS_FIELDS = PATHS + ('recomputes', 'recompute_us', 'stores', 'bytes', 'evictions')
+    METRICS_FLUSH_INTERVAL = 1.0
+    _metrics_buffer = {}
+    _metrics_lock = threading.Lock()
+    _metrics_flushed = 0.0
 
     # 1️⃣ Сначала вспомогательные методы
+    @staticmethod
+    def _rows_mode() -> bool:
+        """
+        Режим хранения списков: 'ids' - только ID (при попадании нужен
+        запрос id__in), 'rows' - компактные кортежи без обращения к БД.
+        """
+        return getattr(settings, 'CATALOG_CACHE_MODE', 'ids') == 'rows'
+
+    @staticmethod
+    def _redis():
+        """Низкоуровневый клиент Redis или None, если кэш не на Redis"""
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection('default')
+        except (ImportError, NotImplementedError):
+            return None
+
+    @classmethod
+    def _local(cls, key_name: str = None) -> Optional[LocalCache]:
+        """Процессный кэш L1 для семейства ключей (или None)"""
+        if not cls.L1_SETTINGS:
+            return None
+        if key_name is not None and key_name not in cls.L1_SETTINGS.get('KEYS', cls.KEYS):
+            return None
+        if cls._l1 is None or cls._listener_pid != os.getpid():
+            with _l1_init_lock:
+                # Пока ждали блокировку, L1 мог создать другой поток
+                if cls._l1 is None or cls._listener_pid != os.getpid():
+                    cls._init_local()
+        return cls._l1
+
+    @classmethod
+    def _init_local(cls):
+        """Создать кэш L1 и подписаться на инвалидацию от других процессов"""
+        max_size = cls.L1_SETTINGS.get('MAX_SIZE', 256)
+        ttl = cls.L1_SETTINGS.get('TTL', 60)
+        cls._l1 = LocalCache(max_size, ttl)
+        cls._l1_generations = LocalCache(max_size, ttl)
+        # После fork у процесса нет потока-слушателя - запускаем заново
+        cls._listener_pid = os.getpid()
+
+        connection = cls._redis()
+        if connection is None:
+            # Без pub/sub устаревание L1 ограничено его TTL
+            return
+        thread = threading.Thread(
+            target=cls._listen, args=(connection,),
+            name='catalog-cache-invalidation', daemon=True,
+        )
+        thread.start()
+
+    @staticmethod
+    def _channel() -> str:
+        """Канал pub/sub для инвалидации L1"""
+        return cache.make_key('catalog:invalidate')
+
+    @classmethod
+    def _listen(cls, connection):
+        """Поток-слушатель: сбрасывает L1 по сообщениям от других процессов"""
+        while True:
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(cls._channel())
+                for message in pubsub.listen():
+                    data = message['data']
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    cls._drop_local(data.split())
+            except Exception:
+                logger.warning('Подписка на инвалидацию кэша каталога прервана', exc_info=True)
+                # Сообщения могли потеряться - сбрасываем L1 целиком
+                cls._drop_local([cls.ROOT_NAMESPACE])
+                time.sleep(1)
+
+    @classmethod
+    def _drop_local(cls, namespaces: List[str]):
+        """Забыть поколения пространств имен в L1 этого процесса"""
+        if cls._l1 is None:
+            return
+        if cls.ROOT_NAMESPACE in namespaces:
+            cls._l1.clear()
+            cls._l1_generations.clear()
+            return
+        # Значения со старыми поколениями больше не адресуются и вытеснятся сами
+        cls._l1_generations.delete_many(
+            cls._generation_key(namespace) for namespace in namespaces
+        )
+
+    @classmethod
+    def layer_stats(cls, metrics: Dict = None) -> Dict[str, Dict[str, Any]]:
+        """Доля попаданий по уровням: L1 (этот процесс) и L2 (Redis, все процессы)"""
+        local = cls._local()
+        l1 = local.stats() if local else {'hits': 0, 'misses': 0, 'hit_ratio': 0.0}
+
+        hits = misses = 0
+        for paths in (metrics or cls.metrics()).values():
+            hits += paths['hit'] + paths['stale'] + paths['early']
+            misses += paths['miss'] + paths['refresh'] + paths['wait']
+        total = hits + misses
+        l2 = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+        return {'l1': l1, 'l2': l2}
+
+    @staticmethod
+    def _generation_key(namespace: str) -> str:
+        """Ключ счетчика поколения пространства имен"""
+        return f"catalog:gen:{namespace}"
+
+    @classmethod
+    def _generations(cls, *namespaces: str) -> List[int]:
+        """Текущие поколения пространств имен (одним запросом)"""
+        keys = [cls._generation_key(namespace) for namespace in namespaces]
+
+        local = cls._local() and cls._l1_generations
+        if local is None:
+            values = cache.get_many(keys)
+            return [values.get(key, 0) for key in keys]
+
+        values = {key: local.get(key) for key in keys}
+        missing = [key for key, value in values.items() if value is None]
+        if missing:
+            fetched = cache.get_many(missing)
+            for key in missing:
+                values[key] = fetched.get(key, 0)
+                local.set(key, values[key])
+        return [values[key] for key in keys]
+
+    @staticmethod
+    def _changed_key(namespace: str) -> str:
+        """Ключ времени последнего изменения пространства имен"""
+        return f"catalog:changed:{namespace}"
+
+    @classmethod
+    def versions(cls, *namespaces: str) -> Dict[str, tuple]:
+        """
+        Поколение и время последнего изменения (секунды или None)
+        пространств имен: маркеры изменений для условных GET-запросов.
+        """
+        generations = cls._generations(*namespaces)
+        changed = cache.get_many([cls._changed_key(namespace) for namespace in namespaces])
+        return {
+            namespace: (generation, changed.get(cls._changed_key(namespace)))
+            for namespace, generation in zip(namespaces, generations)
+        }
+
+    @classmethod
+    def mark_changed(cls, namespace: str, changed_at: int):
+        """Запомнить время изменения, если маркера еще нет (восстановлено из БД)"""
+        cache.add(cls._changed_key(namespace), int(changed_at), cls.GENERATION_TTL)
+
     @classmethod
     def _key(cls, key_name: str, **params) -> str:
-        """Генерация ключа кэша"""
+        """Генерация ключа кэша с учетом поколений пространств имен"""
         if key_name not in cls.KEYS:
             # Создаем ключ по умолчанию
             param_hash = hashlib.md5(str(params).encode()).hexdigest()[:8]
             return f"{key_name}:{param_hash}"
 
         key_template, _ = cls.KEYS[key_name]
-        if params:
-            return key_template.format(**params)
-        return key_template
+        base = key_template.format(**params) if params else key_template
+
+        namespace = cls.NAMESPACES[key_name].format(**params)
+        root, generation = cls._generations(cls.ROOT_NAMESPACE, namespace)
+        return f"{base}:g{root}.{generation}"
+
+    @classmethod
+    def _bump(cls, *namespaces: str):
+        """
+        Сменить поколение пространств имен (O(1) на пространство).
+        На Redis все INCR и уведомление L1 уходят одним конвейером.
+        """
+        if not namespaces:
+            return
+
+        # Данные поменялись - мемоизированные в этом запросе вызовы устарели
+        memo = _request_memo.get()
+        if memo:
+            memo.clear()
+
+        for key_name, count in cls._families_of(namespaces).items():
+            cls._count(key_name, 'evictions', count)
+
+        # Время изменения (целые секунды) - для заголовков Last-Modified
+        changed_at = int(time.time())
+        connection = cls._redis()
+        if connection is not None:
+            pipe = connection.pipeline(transaction=False)
+            for namespace in namespaces:
+                key = cache.make_key(cls._generation_key(namespace))
+                pipe.incr(key)
+                pipe.expire(key, cls.GENERATION_TTL)
+                pipe.set(cache.make_key(cls._changed_key(namespace)), changed_at, ex=cls.GENERATION_TTL)
+            if cls.L1_SETTINGS:
+                # Сообщаем остальным процессам, что их L1 устарел
+                pipe.publish(cls._channel(), ' '.join(namespaces))
+            pipe.execute()
+        else:
+            for namespace in namespaces:
+                key = cls._generation_key(namespace)
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    # Счетчика еще нет (поколение 0) - сразу ставим 1
+                    if not cache.add(key, 1, cls.GENERATION_TTL):
+                        cache.incr(key)
+            cache.set_many(
+                {cls._changed_key(namespace): changed_at for namespace in namespaces},
+                cls.GENERATION_TTL,
+            )
+
+        if cls.L1_SETTINGS:
+            cls._drop_local(list(namespaces))
+
+    @classmethod
+    def _families_of(cls, namespaces) -> Dict[str, int]:
+        """Сколько пространств имен каждого семейства ключей затронуто"""
+        counts = {}
+        for namespace in namespaces:
+            for key_name, template in cls.NAMESPACES.items():
+                prefix = template.split('{')[0]
+                if namespace == cls.ROOT_NAMESPACE or (
+                    namespace.startswith(prefix) if '{' in template else namespace == template
+                ):
+                    counts[key_name] = counts.get(key_name, 0) + 1
+        return counts
 
     @classmethod
     def _ttl(cls, key_name: str) -> int:
@@ -40,29 +622,280 @@ class CatalogCache:
             return cls.KEYS[key_name][1]
         return 300  # По умолчанию 5 минут
 
+    @staticmethod
+    def _stats_key(key_name: str) -> str:
+        """Ключ счетчиков семейства ключей"""
+        return f"catalog:stats:{key_name}"
+
     @classmethod
-    def _cache_query(cls, key: str, queryset: QuerySet) -> QuerySet:
-        """Кэширование QuerySet"""
-        cached = cache.get(key)
-        if cached:
-            return cls._restore_queryset(queryset.model, cached['ids'])
+    def _count(cls, key_name: str, field: str, amount: int = 1):
+        """
+        Увеличить счетчик семейства ключей.
+        Счетчики копятся в процессе и уходят в Redis пачкой раз в секунду.
+        """
+        with cls._metrics_lock:
+            fields = cls._metrics_buffer.setdefault(key_name, {})
+            fields[field] = fields.get(field, 0) + amount
+            due = time.monotonic() - cls._metrics_flushed >= cls.METRICS_FLUSH_INTERVAL
+        if due:
+            cls.flush_metrics()
+
+    @classmethod
+    def flush_metrics(cls):
+        """Отправить накопленные счетчики в кэш"""
+        with cls._metrics_lock:
+            buffer, cls._metrics_buffer = cls._metrics_buffer, {}
+            cls._metrics_flushed = time.monotonic()
+        if not buffer:
+            return
+
+        connection = cls._redis()
+        if connection is not None:
+            # Хэш на семейство, все HINCRBY одним конвейером
+            pipe = connection.pipeline(transaction=False)
+            for key_name, fields in buffer.items():
+                key = cache.make_key(cls._stats_key(key_name))
+                for field, amount in fields.items():
+                    pipe.hincrby(key, field, amount)
+            pipe.execute()
+            return
+
+        for key_name, fields in buffer.items():
+            for field, amount in fields.items():
+                key = f"{cls._stats_key(key_name)}:{field}"
+                try:
+                    cache.incr(key, amount)
+                except ValueError:
+                    # Счетчика еще нет - создаем без срока жизни
+                    if not cache.add(key, amount, None):
+                        cache.incr(key, amount)
+
+    @classmethod
+    def metrics(cls) -> Dict[str, Dict[str, int]]:
+        """Счетчики по семействам ключей (пути чтения, пересчеты, объем, вытеснения)"""
+        cls.flush_metrics()
+        result = {key_name: dict.fromkeys(cls.STATS_FIELDS, 0) for key_name in cls.KEYS}
+
+        connection = cls._redis()
+        if connection is not None:
+            pipe = connection.pipeline(transaction=False)
+            for key_name in cls.KEYS:
+                pipe.hgetall(cache.make_key(cls._stats_key(key_name)))
+            for key_name, values in zip(cls.KEYS, pipe.execute()):
+                for field, value in values.items():
+                    field = field.decode() if isinstance(field, bytes) else field
+                    result[key_name][field] = int(value)
+            return result
+
+        keys = {
+            f"{cls._stats_key(key_name)}:{field}": (key_name, field)
+            for key_name in cls.KEYS for field in cls.STATS_FIELDS
+        }
+        for key, value in cache.get_many(list(keys)).items():
+            key_name, field = keys[key]
+            result[key_name][field] = value
+        return result
+
+    @classmethod
+    def reset_metrics(cls):
+        """Обнулить счетчики"""
+        with cls._metrics_lock:
+            cls._metrics_buffer = {}
+        cache.delete_many([cls._stats_key(key_name) for key_name in cls.KEYS])
+        cache.delete_many([
+            f"{cls._stats_key(key_name)}:{field}"
+            for key_name in cls.KEYS for field in cls.STATS_FIELDS
+        ])
+
+    @classmethod
+    def report(cls) -> Dict[str, Any]:
+        """Сводка для подбора TTL: доли попаданий, стоимость пересчета, объем"""
+        families = {}
+        metrics = cls.metrics()
+        for key_name, counters in metrics.items():
+            template, ttl = cls.KEYS[key_name]
+            hits = counters['hit'] + counters['stale'] + counters['early']
+            reads = hits + counters['miss'] + counters['refresh'] + counters['wait']
+            recomputes = counters['recomputes']
+            families[key_name] = {
+                'template': template,
+                'ttl': ttl,
+                'reads': reads,
+                'hit_ratio': round(hits / reads, 4) if reads else 0.0,
+                'avg_recompute_ms': round(counters['recompute_us'] / recomputes / 1000, 2) if recomputes else 0.0,
+                'avg_payload_bytes': counters['bytes'] // counters['stores'] if counters['stores'] else 0,
+                **counters,
+            }
+        return {'families': families, 'layers': cls.layer_stats(metrics)}
+
+    @classmethod
+    def _envelope(cls, key_name: str, value: Any, delta: float) -> tuple:
+        """Конверт значения: (значение, мягкий срок истечения, время пересчета)"""
+        return value, time.time() + cls._ttl(key_name), delta
+
+    @classmethod
+    def _store(cls, key_name: str, key: str, compute: Callable) -> Any:
+        """Вычислить значение и положить его в кэш вместе с мягким сроком"""
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        cls._count(key_name, 'recomputes')
+        cls._count(key_name, 'recompute_us', int(delta * 1_000_000))
+
+        if value is not None:
+            entry = cls._envelope(key_name, value, delta)
+            payload = cls.serializer.dumps(entry)
+            cache.set(key, payload, cls._ttl(key_name) + cls.STALE_TTL)
+            cls._count(key_name, 'stores')
+            cls._count(key_name, 'bytes', len(payload))
+            local = cls._local(key_name)
+            if local is not None:
+                local.set(key, entry)
+        return value
+
+    @classmethod
+    def _decode(cls, payload) -> Optional[tuple]:
+        """Конверт из кэша или None (пусто или запись чужого формата)"""
+        entry = cls.serializer.loads(payload)
+        if isinstance(entry, tuple) and len(entry) == 3:
+            return entry
+        return None
+
+    @classmethod
+    def _should_refresh_early(cls, soft_expire: float, delta: float, now: float) -> bool:
+        """Вероятностное раннее обновление (XFetch): чем ближе срок, тем вероятнее"""
+        if not cls.EARLY_REFRESH_BETA:
+            return False
+        return now - delta * cls.EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= soft_expire
+
+    @classmethod
+    def _fetch(cls, key_name: str, key: str, compute: Callable) -> Any:
+        """
+        Чтение с защитой от одновременного пересчета (single-flight).
+
+        Пересчитывает значение только воркер, взявший блокировку в кэше,
+        остальные в это время получают устаревшее значение.
+        """
+        local = cls._local(key_name)
+        if local is not None:
+            entry = local.get(key)
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
+
+        entry = cls._decode(cache.get(key))
+        now = time.time()
+        lock_key = f"{key}:lock"
+
+        if entry is not None:
+            value, soft_expire, delta = entry
+            expired = now >= soft_expire
+            if not expired and not cls._should_refresh_early(soft_expire, delta, now):
+                cls._count(key_name, 'hit')
+                if local is not None:
+                    local.set(key, entry)
+                return value
+
+            token = uuid.uuid4().hex
+            if cls._acquire(lock_key, token):
+                cls._count(key_name, 'refresh' if expired else 'early')
+                try:
+                    return cls._store(key_name, key, compute)
+                finally:
+                    cls._release(lock_key, token)
 
-        result = list(queryset)
+            # Кто-то уже пересчитывает - отдаем то, что есть
+            cls._count(key_name, 'stale')
+            return value
 
-        # Определяем TTL
-        timeout = 300  # По умолчанию
-        for key_name, (key_template, ttl) in cls.KEYS.items():
-            if key == key_template or key.startswith(key_template.split('{')[0]):
-                timeout = ttl
-                break
+        token = uuid.uuid4().hex
+        if cls._acquire(lock_key, token):
+            cls._count(key_name, 'miss')
+            try:
+                return cls._store(key_name, key, compute)
+            finally:
+                cls._release(lock_key, token)
 
-        cache.set(key, {'ids': [obj.id for obj in result]}, timeout)
-        return queryset
+        # Значения нет, но его уже считает другой воркер - недолго ждем
+        cls._count(key_name, 'wait')
+        deadline = time.monotonic() + cls.LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cls._decode(cache.get(key))
+            if entry is not None:
+                return entry[0]
+
+        # Не дождались - считаем сами
+        return cls._store(key_name, key, compute)
+
+    # Удалить ключ, только если в нем наш токен (одна атомарная операция Redis)
+    RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) end return 0"
+    )
+
+    @classmethod
+    def _acquire(cls, lock_key: str, token: str) -> bool:
+        """Взять блокировку пересчета с токеном владельца"""
+        connection = cls._redis()
+        if connection is not None:
+            # Токен пишется как есть (без сериализатора кэша) - его сравнивает RELEASE_SCRIPT
+            return bool(connection.set(cache.make_key(lock_key), token, nx=True, ex=cls.LOCK_TTL))
+        return cache.add(lock_key, token, cls.LOCK_TTL)
+
+    @classmethod
+    def _release(cls, lock_key: str, token: str):
+        """Снять блокировку, только если она все еще наша"""
+        connection = cls._redis()
+        if connection is not None:
+            # Проверка и удаление одним скриптом: истекшая и взятая другим
+            # воркером блокировка не удаляется
+            connection.eval(cls.RELEASE_SCRIPT, 1, cache.make_key(lock_key), token)
+        elif cache.get(lock_key) == token:
+            # Кэш в памяти процесса (разработка и тесты)
+            cache.delete(lock_key)
+
+    @classmethod
+    def _keys(cls, key_name: str, params_list: List[Dict]) -> List[str]:
+        """Ключи для набора параметров одного семейства (поколения одним запросом)"""
+        template = cls.KEYS[key_name][0]
+        namespaces = [cls.NAMESPACES[key_name].format(**params) for params in params_list]
+        unique = list(dict.fromkeys(namespaces))
+        generations = dict(zip(unique, cls._generations(*unique)))
+        root, = cls._generations(cls.ROOT_NAMESPACE)
+        return [
+            f"{template.format(**params)}:g{root}.{generations[namespace]}"
+            for params, namespace in zip(params_list, namespaces)
+        ]
+
+    @classmethod
+    def _list_value(cls, queryset: QuerySet) -> List:
+        """Значение для кэша списка: кортежи колонок или только ID"""
+        row_class = cls.ROW_CLASSES.get(queryset.model)
+        if row_class is ProductRow and cls._rows_mode():
+            # Кортежи колонок: при попадании в кэш запросов к БД нет вовсе
+            return [ProductRow.pack(row) for row in ProductRow.card_values(queryset)]
+        if row_class and cls._rows_mode():
+            return list(queryset.values_list(*row_class.FIELDS))
+        return list(queryset.values_list('id', flat=True))
+
+    @classmethod
+    def _cache_query(cls, key_name: str, queryset: QuerySet, **params):
+        """Кэширование QuerySet"""
+        value = cls._fetch(
+            key_name, cls._key(key_name, **params),
+            lambda: cls._list_value(queryset),
+        )
+        row_class = cls.ROW_CLASSES.get(queryset.model)
+        if row_class and cls._rows_mode():
+            return [row_class(row) for row in value]
+        return cls._restore_queryset(queryset.model, value)
 
     @staticmethod
     def _restore_queryset(model, ids: List[int]) -> QuerySet:
         """Восстановление QuerySet из кэша"""
         objects = model.objects.filter(id__in=ids)
+        if model is Product:
+            objects = ProductRow.card_objects(objects)
         obj_dict = {obj.id: obj for obj in objects}
         ordered = [obj_dict[i] for i in ids if i in obj_dict]
 
@@ -71,120 +904,325 @@ class CatalogCache:
         qs._prefetch_done = True
         return qs
 
-    # 2️⃣ Затем основные публичные методы
-    @classmethod
-    def get_products(cls, category_slug: str = None) -> QuerySet:
-        """Получить продукты (все или по категории)"""
+    # Вычисление значений без обращения к кэшу
+    @staticmethod
+    def _products_queryset(category_slug: str = None) -> QuerySet:
+        """Опубликованные продукты (все или по категории)"""
+        qs = Product.objects.filter(is_published=True)
         if category_slug:
-            key = cls._key('products_category', slug=category_slug)
-            qs = Product.objects.filter(
-                category__slug=category_slug,
-                is_published=True
+            qs = qs.filter(category__slug=category_slug)
+        return qs.select_related('category', 'owner')
+
+    @staticmethod
+    def _compute_category_info(slug: str) -> Optional[Dict]:
+        """Информация о категории из БД (простые структуры)"""
+        # Статистика - из денормализованной CategoryStats (JOIN по первичному ключу)
+        row = Category.objects.filter(slug=slug).values_list(
+            *CategoryRow.FIELDS,
+            'stats__published_count', 'stats__price_sum', 'stats__min_price', 'stats__max_price',
+        ).first()
+        if row is None:
+            return None
+
+        category = row[:len(CategoryRow.FIELDS)]
+        count, price_sum, min_price, max_price = row[len(CategoryRow.FIELDS):]
+        count = count or 0
+        avg_price = (price_sum / count).quantize(Decimal('0.01')) if count else None
+        products = Product.objects.filter(category_id=category[0], is_published=True)
+        return {
+            'category': category,
+            'stats': {
+                'count': count,
+                'avg_price': to_decimal_str(avg_price),
+                'max_price': to_decimal_str(max_price),
+                'min_price': to_decimal_str(min_price),
+            },
+            'recent': [ProductRow.pack(row) for row in ProductRow.card_values(products)[:5]],
+        }
+
+    @staticmethod
+    def _compute_products_info(ids: List[int], card: bool = False) -> Dict[int, tuple]:
+        """Опубликованные продукты по ID одним запросом (страница или карточка списка)"""
+        products = Product.objects.filter(id__in=ids, is_published=True)
+        rows = ProductRow.card_values(products) if card else products.values_list(
+            *ProductRow.DETAIL_FIELDS
+        )
+        return {row[0]: ProductRow.pack(row) for row in rows}
+
+    @classmethod
+    def _refresh_snapshot(cls, snapshot):
+        """
+        Обновить снимок статистики при чтении (только если есть изменения).
+        Обновляет один воркер под блокировкой, остальные отдают текущий
+        снимок, а если его еще нет - недолго ждут первый.
+        """
+        lock_key, token = 'catalog:stats:refresh:lock', uuid.uuid4().hex
+        if not cls._acquire(lock_key, token):
+            deadline = time.monotonic() + cls.LOCK_WAIT
+            while snapshot is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+                snapshot = stats_snapshot.get_snapshot()
+            if snapshot is not None:
+                return snapshot
+            # Не дождались - обновляем сами
+            return stats_snapshot.refresh()[0]
+        try:
+            return stats_snapshot.refresh()[0]
+        finally:
+            cls._release(lock_key, token)
+
+    @classmethod
+    def _compute_stats(cls) -> Dict:
+        """Статистика каталога из материализованного снимка (простые структуры)"""
+        snapshot = stats_snapshot.get_snapshot()
+        max_age = getattr(settings, 'CATALOG_STATS_MAX_AGE', 600)
+        if snapshot is None or (timezone.now() - snapshot.checked_at).total_seconds() > max_age:
+            # Команду давно не запускали - обновляем снимок сами
+            snapshot = cls._refresh_snapshot(snapshot)
+
+        counts = dict(snapshot.top_categories)
+        names = {
+            row[0]: row for row in
+            Category.objects.filter(pk__in=list(counts)).values_list(*CategoryRow.FIELDS)
+        }
+        return {
+            'overall': {
+                'total': snapshot.total_products,
+                'avg_price': to_decimal_str(snapshot.avg_price),
+                'categories': snapshot.categories_count,
+            },
+            'categories': [
+                names[category_id] + (count,)
+                for category_id, count in snapshot.top_categories if category_id in names
+            ],
+            'snapshot': {
+                'refreshed_at': to_micros(snapshot.refreshed_at),
+                'duration_ms': snapshot.refresh_duration_ms,
+                'staleness_seconds': snapshot.staleness_seconds,
+            },
+        }
+
+    @staticmethod
+    def _compute_suggestions(prefix: str) -> Dict:
+        """Подсказки автодополнения из БД (простые структуры)"""
+        options = getattr(settings, 'CATALOG_AUTOCOMPLETE', {})
+        return get_search_backend().suggest(prefix, limit=options.get('LIMIT', 8))
+
+    @classmethod
+    def _compute(cls, key_name: str, **params) -> Any:
+        """Вычислить значение любого семейства ключей"""
+        if key_name == 'products_all':
+            return cls._list_value(cls._products_queryset())
+        if key_name == 'products_category':
+            return cls._list_value(cls._products_queryset(params['slug']))
+        if key_name == 'categories_all':
+            return cls._list_value(Category.objects.all().order_by('name'))
+        if key_name == 'category_detail':
+            return cls._compute_category_info(params['slug'])
+        if key_name == 'product_stats':
+            return cls._compute_stats()
+        if key_name in ('product_detail', 'product_card'):
+            products = cls._compute_products_info([params['id']], card=key_name == 'product_card')
+            return products.get(params['id'], cls.NOT_FOUND)
+        if key_name == 'suggestions':
+            return cls._compute_suggestions(params['prefix'])
+        raise KeyError(key_name)
+
+    @classmethod
+    def warm(cls, key_name: str, params_list: List[Dict] = None) -> int:
+        """
+        Заполнить кэш семейства ключей для набора параметров одним set_many.
+        Возвращает количество записанных ключей.
+        """
+        params_list = params_list or [{}]
+        keys = cls._keys(key_name, params_list)
+
+        started = time.monotonic()
+        if key_name in ('product_detail', 'product_card'):
+            # Все продукты пачки одним запросом
+            products = cls._compute_products_info(
+                [params['id'] for params in params_list], card=key_name == 'product_card',
             )
+            values = [products.get(params['id']) for params in params_list]
         else:
-            key = cls._key('products_all')
-            qs = Product.objects.filter(is_published=True)
+            values = [cls._compute(key_name, **params) for params in params_list]
+        delta = (time.monotonic() - started) / len(params_list)
+
+        entries = {
+            key: cls.serializer.dumps(cls._envelope(key_name, value, delta))
+            for key, value in zip(keys, values) if value is not None
+        }
+        cache.set_many(entries, cls._ttl(key_name) + cls.STALE_TTL)
 
-        return cls._cache_query(key, qs.select_related('category', 'owner'))
+        cls._count(key_name, 'recomputes', len(params_list))
+        cls._count(key_name, 'recompute_us', int(delta * len(params_list) * 1_000_000))
+        cls._count(key_name, 'stores', len(entries))
+        cls._count(key_name, 'bytes', sum(len(payload) for payload in entries.values()))
+        return len(entries)
 
+    # 2️⃣ Затем основные публичные методы
     @classmethod
-    def get_categories(cls) -> QuerySet:
-        """Получить все категории"""
+    @request_memoized
+    def get_products(cls, category_slug: str = None):
+        """
+        Получить продукты (все или по категории).
+        В режиме 'rows' возвращает список ProductRow, иначе QuerySet.
+        """
+        if category_slug:
+            return cls._cache_query(
+                'products_category', cls._products_queryset(category_slug),
+                slug=category_slug,
+            )
+        return cls._cache_query('products_all', cls._products_queryset())
+
+    @classmethod
+    @request_memoized
+    def get_categories(cls):
+        """Получить все категории (QuerySet или список CategoryRow)"""
         return cls._cache_query(
-            cls._key('categories_all'),
+            'categories_all',
             Category.objects.all().order_by('name')
         )
 
     @classmethod
+    @request_memoized
     def get_category_info(cls, slug: str) -> Optional[Dict]:
         """Получить информацию о категории"""
-        key = cls._key('category_detail', slug=slug)
-        cached = cache.get(key)
-        if cached:
-            return cached
-
-        try:
-            category = Category.objects.get(slug=slug)
-            products = Product.objects.filter(category=category, is_published=True)
-
-            info = {
-                'category': category,
-                'stats': products.aggregate(
-                    count=Count('id'),
-                    avg_price=Avg('price'),
-                    max_price=Max('price'),
-                    min_price=Min('price')
-                ),
-                'recent': list(products.select_related('owner')[:5]),
-            }
-            cache.set(key, info, cls._ttl('category_detail'))
-            return info
-        except Category.DoesNotExist:
+        info = cls._fetch(
+            'category_detail', cls._key('category_detail', slug=slug),
+            lambda: cls._compute_category_info(slug),
+        )
+        if info is None:
             return None
 
+        stats = dict(info['stats'])
+        for name in ('avg_price', 'max_price', 'min_price'):
+            stats[name] = from_decimal_str(stats[name])
+        return {
+            'category': CategoryRow(info['category']),
+            'stats': stats,
+            'recent': [ProductRow(row) for row in info['recent']],
+        }
+
     @classmethod
-    def get_product_info(cls, product_id: int) -> Optional[Dict]:
+    @request_memoized
+    def get_product_info(cls, product_id: int) -> Optional[ProductRow]:
         """Получить информацию о продукте"""
-        key = cls._key('product_detail', id=product_id)
-        cached = cache.get(key)
-        if cached:
-            return cached
+        product = cls._fetch(
+            'product_detail', cls._key('product_detail', id=product_id),
+            lambda: cls._compute('product_detail', id=product_id),
+        )
+        return None if product == cls.NOT_FOUND else ProductRow(product)
 
-        try:
-            product = Product.objects.select_related('category', 'owner').get(
-                id=product_id, is_published=True
-            )
-            cache.set(key, product, cls._ttl('product_detail'))
-            return product
-        except Product.DoesNotExist:
-            return None
+    @classmethod
+    @request_memoized
+    def get_suggestions(cls, prefix: str) -> Dict:
+        """Подсказки автодополнения для нормализованного префикса"""
+        digest = hashlib.md5(prefix.encode()).hexdigest()
+        return cls._fetch(
+            'suggestions', cls._key('suggestions', digest=digest),
+            lambda: cls._compute('suggestions', prefix=prefix),
+        )
+
+    @classmethod
+    @request_memoized
+    def get_products_info(cls, ids: List[int]) -> List:
+        """
+        Получить карточки нескольких продуктов сразу: один get_many по кэшу,
+        промахи - одним запросом к БД и обратно в кэш одним set_many.
+        Порядок совпадает с ids; дубликаты и отсутствующие продукты пропускаются.
+        """
+        ids = list(dict.fromkeys(int(pk) for pk in ids))
+        if not ids:
+            return []
+
+        keys = dict(zip(ids, cls._keys('product_card', [{'id': pk} for pk in ids])))
+        cached = cache.get_many(list(keys.values()))
+
+        now = time.time()
+        found, missing = {}, []
+        for pk, key in keys.items():
+            entry = cls._decode(cached.get(key))
+            if entry is not None and now < entry[1]:
+                found[pk] = entry[0]
+            else:
+                missing.append(pk)
+        cls._count('product_card', 'hit', len(found))
+
+        if missing:
+            cls._count('product_card', 'miss', len(missing))
+            started = time.monotonic()
+            products = cls._compute_products_info(missing, card=True)
+            delta = time.monotonic() - started
+
+            entries = {}
+            for pk in missing:
+                found[pk] = products.get(pk, cls.NOT_FOUND)
+                entries[keys[pk]] = cls.serializer.dumps(
+                    cls._envelope('product_card', found[pk], delta)
+                )
+            cache.set_many(entries, cls._ttl('product_card') + cls.STALE_TTL)
+            cls._count('product_card', 'recomputes')
+            cls._count('product_card', 'recompute_us', int(delta * 1_000_000))
+            cls._count('product_card', 'stores', len(entries))
+            cls._count('product_card', 'bytes', sum(len(payload) for payload in entries.values()))
+
+        return [ProductRow(found[pk]) for pk in ids if found[pk] != cls.NOT_FOUND]
 
     @classmethod
+    @request_memoized
     def get_stats(cls) -> Dict:
         """Получить статистику"""
-        key = cls._key('product_stats')
-        cached = cache.get(key)
-        if cached:
-            return cached
-
-        stats = {
-            'overall': Product.objects.filter(is_published=True).aggregate(
-                total=Count('id'),
-                avg_price=Avg('price'),
-                categories=Count('category', distinct=True),
-            ),
-            'categories': list(
-                Category.objects.annotate(
-                    count=Count('product', filter=Q(product__is_published=True))
-                ).order_by('-count')[:5]
-            ),
+        stats = cls._fetch('product_stats', cls._key('product_stats'), cls._compute_stats)
+        overall = dict(stats['overall'])
+        overall['avg_price'] = from_decimal_str(overall['avg_price'])
+        snapshot = dict(stats['snapshot'])
+        snapshot['refreshed_at'] = from_micros(snapshot['refreshed_at'])
+        return {
+            'overall': overall,
+            'categories': [CategoryRow(row) for row in stats['categories']],
+            'snapshot': snapshot,
         }
-        cache.set(key, stats, cls._ttl('product_stats'))
-        return stats
 
     # 3️⃣ Методы инвалидации кэша
     @classmethod
-    def invalidate_product(cls, product_id: int = None):
-            """Сбросить кэш продуктов"""
-            if product_id:
-                cache.delete(cls._key('product_detail', id=product_id))
-            cache.delete(cls._key('products_all'))
-            cache.delete(cls._key('product_stats'))
+    def invalidate_product(cls, product_id: int = None, category_slug: str = None):
+        """
+        Сбросить кэш продуктов: общие списки и статистику, карточку
+        продукта и страницы его категории.
+        """
+        namespaces = ['catalog']
+        if product_id:
+            namespaces.append(f'product:{product_id}')
+            if category_slug is None:
+                category_slug = Product.objects.filter(pk=product_id).values_list(
+                    'category__slug', flat=True
+                ).first()
+        if category_slug:
+            namespaces.append(f'category:{category_slug}')
+        cls._bump(*namespaces)
 
     @classmethod
     def invalidate_category(cls, slug: str = None):
-        """Сбросить кэш категорий"""
+        """Сбросить кэш категорий (список категорий и страницы категории)"""
+        namespaces = ['catalog']
         if slug:
-            cache.delete(cls._key('category_detail', slug=slug))
-            cache.delete(cls._key('products_category', slug=slug))
-        else:
-            cache.delete(cls._key('categories_all'))
+            namespaces.append(f'category:{slug}')
+        cls._bump(*namespaces)
+
+    @classmethod
+    def invalidate_namespaces(cls, *namespaces: str):
+        """Сбросить произвольный набор пространств имен за один проход"""
+        cls._bump(*sorted(set(namespaces)))
 
     @classmethod
     def clear(cls):
-        """Очистить весь кэш каталога"""
-        # Просто очищаем весь кэш (простой способ)
-        cache.clear()
+        """
+        Очистить весь кэш каталога.
+        Меняет общее поколение ключей, не трогая остальные данные
+        в кэше (например, сессии).
+        """
+        cls._bump(cls.ROOT_NAMESPACE)
 
 
 # Экспорт синглтона
@@ -0,0 +1,100 @@
+"""
+Компактный версионируемый сериализатор значений кэша каталога.
+
+В кэш попадают только простые структуры (числа, строки, кортежи, списки,
+словари), а не экземпляры моделей: они меньше, быстрее читаются и не
+ломаются при изменении моделей.
+
+Формат записи: заголовок (версия формата, флаги, схема строк) и тело
+в формате marshal; тело больше порога сжимается zlib. Формат marshal
+зависит от версии Python, поэтому она входит в схему: после обновления
+интерпретатора старые записи читаются как промахи. Поврежденная запись
+тоже считается промахом.
+"""
+import marshal
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Optional
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+
+# >B - версия формата, >B - флаги, >I - контрольная сумма схемы строк
+HEADER = struct.Struct('>BBI')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class CacheSerializer:
+    """Сериализатор значений кэша с необязательным сжатием"""
+
+    def __init__(self, schema: str = '', compress_threshold: int = 1024, level: int = 1):
+        # Изменение состава колонок меняет схему - старые записи становятся промахами
+        runtime = f'{marshal.version}:{sys.version_info[0]}.{sys.version_info[1]}'
+        self.schema = zlib.crc32(f'{schema}|{runtime}'.encode())
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    def dumps(self, value: Any) -> bytes:
+        """Простая структура -> байты"""
+        body = marshal.dumps(value)
+        flags = 0
+        if self.compress_threshold and len(body) > self.compress_threshold:
+            body = zlib.compress(body, self.level)
+            flags |= FLAG_ZLIB
+        return HEADER.pack(FORMAT_VERSION, flags, self.schema) + body
+
+    def loads(self, data: bytes) -> Optional[Any]:
+        """Байты -> простая структура; None, если запись чужого формата или повреждена"""
+        if not isinstance(data, bytes) or len(data) < HEADER.size:
+            return None
+        version, flags, schema = HEADER.unpack_from(data)
+        if version != FORMAT_VERSION or schema != self.schema:
+            return None
+
+        body = memoryview(data)[HEADER.size:]
+        try:
+            if flags & FLAG_ZLIB:
+                body = zlib.decompress(body)
+            return marshal.loads(body)
+        except (ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+
+# Преобразования значений, которые marshal не поддерживает
+def to_cents(value: Optional[Decimal]) -> Optional[int]:
+    """Цена -> целое число копеек"""
+    return None if value is None else int(value.scaleb(2))
+
+
+def from_cents(value: Optional[int]) -> Optional[Decimal]:
+    """Целое число копеек -> цена"""
+    return None if value is None else Decimal(value).scaleb(-2)
+
+
+def to_micros(value: Optional[datetime]) -> Optional[int]:
+    """Дата и время -> микросекунды от начала эпохи (UTC)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_micros(value: Optional[int]) -> Optional[datetime]:
+    """Микросекунды от начала эпохи -> дата и время (UTC)"""
+    return None if value is None else EPOCH + value * MICROSECOND
+
+
+def to_decimal_str(value: Optional[Decimal]) -> Optional[str]:
+    """Агрегат (например, средняя цена) -> строка без потери точности"""
+    return None if value is None else str(value)
+
+
+def from_decimal_str(value: Optional[str]) -> Optional[Decimal]:
+    """Строка -> Decimal"""
+    return None if value is None else Decimal(value)
@@ -0,0 +1,110 @@
+"""
+Поддержка денормализованной статистики категорий (CategoryStats).
+
+Вклад продукта в статистику - (категория, цена), пока он опубликован.
+При изменении продукта старый вклад вычитается, новый добавляется
+UPDATE-ами с F-выражениями в транзакции сохранения. Минимум и максимум
+пересчитываются запросом по индексу (category_id, price) только если
+ушедшая цена была на границе диапазона.
+"""
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Category, CategoryStats, Product
+
+Contribution = Optional[Tuple[int, Decimal]]
+# Исходный вклад неизвестен (поля были отложены через defer/only)
+UNKNOWN = 'unknown'
+
+
+def contribution(category_id, price, is_published) -> Contribution:
+    """Вклад продукта в статистику (None - не учитывается)"""
+    if not is_published or category_id is None or price is None:
+        return None
+    return category_id, Decimal(str(price))
+
+
+def apply_change(old: Contribution, new: Contribution, using: str = 'default',
+                 category_ids: Iterable[int] = ()):
+    """
+    Перенести вклад продукта из old в new.
+    category_ids - исходная и текущая категории продукта: если исходный
+    вклад неизвестен, они пересчитываются целиком.
+    """
+    if old == UNKNOWN:
+        category_ids = sorted({pk for pk in category_ids if pk is not None})
+        if category_ids:
+            rebuild(using=using, category_ids=category_ids)
+        return
+    if old == new:
+        return
+    if old is not None:
+        _remove(*old, using=using)
+    if new is not None:
+        _add(*new, using=using)
+
+
+def _add(category_id: int, price: Decimal, using: str):
+    stats = CategoryStats.objects.using(using)
+    stats.bulk_create([CategoryStats(category_id=category_id)], ignore_conflicts=True)
+    stats.filter(pk=category_id).update(
+        published_count=F('published_count') + 1,
+        price_sum=F('price_sum') + price,
+        min_price=Case(When(Q(min_price__isnull=True) | Q(min_price__gt=price), then=price),
+                       default=F('min_price')),
+        max_price=Case(When(Q(max_price__isnull=True) | Q(max_price__lt=price), then=price),
+                       default=F('max_price')),
+        # update() не заполняет auto_now; по updated_at работает снимок статистики
+        updated_at=timezone.now(),
+    )
+
+
+def _remove(category_id: int, price: Decimal, using: str):
+    stats = CategoryStats.objects.using(using)
+    stats.filter(pk=category_id).update(
+        published_count=F('published_count') - 1,
+        price_sum=F('price_sum') - price,
+        updated_at=timezone.now(),
+    )
+    # Ушла граничная цена - пересчитываем min/max по индексу категории
+    if stats.filter(Q(min_price__gte=price) | Q(max_price__lte=price), pk=category_id).exists():
+        bounds = Product.objects.using(using).filter(
+            category_id=category_id, is_published=True
+        ).aggregate(min_price=Min('price'), max_price=Max('price'))
+        stats.filter(pk=category_id).update(**bounds)
+
+
+def rebuild(using: str = 'default', category_ids=None) -> int:
+    """Пересчитать статистику категорий (по умолчанию всех) одним GROUP BY"""
+    products = Product.objects.using(using).filter(is_published=True)
+    categories = Category.objects.using(using)
+    if category_ids is not None:
+        products = products.filter(category_id__in=category_ids)
+        categories = categories.filter(pk__in=category_ids)
+
+    totals = {
+        row['category_id']: row for row in
+        products.values('category_id').annotate(
+            count=Count('id'), total=Coalesce(Sum('price'), Decimal('0')),
+            low=Min('price'), high=Max('price'),
+        ).order_by()
+    }
+    rows = []
+    for category_id in categories.values_list('id', flat=True):
+        row = totals.get(category_id, {})
+        rows.append(CategoryStats(
+            category_id=category_id,
+            published_count=row.get('count', 0),
+            price_sum=row.get('total', Decimal('0')),
+            min_price=row.get('low'),
+            max_price=row.get('high'),
+        ))
+    CategoryStats.objects.using(using).bulk_create(
+        rows, batch_size=1000, update_conflicts=True, unique_fields=['category'],
+        update_fields=['published_count', 'price_sum', 'min_price', 'max_price', 'updated_at'],
+    )
+    return len(rows)
@@ -0,0 +1,105 @@
+"""
+Условные GET-запросы страниц каталога (ETag / Last-Modified).
+
+Валидаторы строятся из маркеров изменений CatalogCache - поколения
+пространства имен и времени его последнего изменения. Маркеры лежат
+в кэше (Redis), поэтому ответ 304 не рендерит шаблон и не обращается
+к БД; к БД идем, только если маркера времени еще нет.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, List, Optional
+
+from django.contrib import messages
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from .cache import CatalogCache
+from .models import Product
+
+
+def _restore_changed_at(namespace: str) -> Optional[int]:
+    """Время изменения из Product.updated_at, если маркера в кэше нет"""
+    products = Product.objects.all()
+    if namespace.startswith('product:'):
+        products = products.filter(pk=namespace.split(':', 1)[1])
+    elif namespace.startswith('category:'):
+        products = products.filter(category__slug=namespace.split(':', 1)[1])
+    elif namespace != 'catalog':
+        return None
+
+    changed = products.aggregate(changed=Max('updated_at'))['changed']
+    if changed is None:
+        return None
+    CatalogCache.mark_changed(namespace, changed.timestamp())
+    return int(changed.timestamp())
+
+
+def has_pending_messages(request) -> bool:
+    """Есть непоказанные сообщения - страницу нужно отрисовать заново"""
+    return bool(len(messages.get_messages(request)))
+
+
+def _markers(request, scope: Callable, args, kwargs) -> Optional[List[tuple]]:
+    """
+    Маркеры изменений страницы (один раз на запрос).
+    None - страницу нельзя отдавать как 304 (есть непоказанные сообщения).
+    """
+    if not hasattr(request, '_catalog_markers'):
+        if has_pending_messages(request):
+            request._catalog_markers = None
+        else:
+            namespaces = [CatalogCache.ROOT_NAMESPACE, *scope(request, *args, **kwargs)]
+            request._catalog_markers = [
+                (namespace, generation, changed_at if changed_at is not None else _restore_changed_at(namespace))
+                for namespace, (generation, changed_at) in CatalogCache.versions(*namespaces).items()
+            ]
+    return request._catalog_markers
+
+
+def conditional_page(scope: Callable) -> Callable:
+    """
+    Декоратор view: ETag и Last-Modified по маркерам пространств имен,
+    которые возвращает scope(request, *args, **kwargs).
+    """
+    def etag(request, *args, **kwargs):
+        markers = _markers(request, scope, args, kwargs)
+        if markers is None:
+            return None
+        # Страница зависит от пользователя (кнопки владельца, шапка), а у вошедшего
+        # еще и от сессии: форма выхода в шапке содержит CSRF-токен, который
+        # меняется при каждом входе
+        if request.user.is_authenticated:
+            user = (request.user.pk, request.session.session_key, request.META.get('CSRF_COOKIE'))
+        else:
+            user = 'anonymous'
+        return hashlib.md5(repr((user, markers)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        markers = _markers(request, scope, args, kwargs)
+        # If-Modified-Since не различает пользователей - только для анонимных
+        if markers is None or request.user.is_authenticated:
+            return None
+        changed = [changed_at for _, _, changed_at in markers if changed_at is not None]
+        return datetime.fromtimestamp(max(changed), tz=dt_timezone.utc) if changed else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+# Области страниц: от каких пространств имен зависит содержимое
+def catalog_scope(request, *args, **kwargs) -> List[str]:
+    """Списки продуктов: меняются при любом изменении каталога"""
+    return ['catalog']
+
+
+def category_scope(request, slug, *args, **kwargs) -> List[str]:
+    """Страница категории: ее продукты и сама категория"""
+    return [f'category:{slug}']
+
+
+def product_scope(request, pk, *args, **kwargs) -> List[str]:
+    """Страница продукта: сам продукт и его категория (название и ссылка на нее)"""
+    product = CatalogCache.get_product_info(pk)
+    if product is None or not product.category_id:
+        return [f'product:{pk}']
+    return [f'product:{pk}', f'category:{product.category.slug}']
@@ -0,0 +1,295 @@
+"""
+Фасетная фильтрация списков продуктов.
+
+Фасеты: категория, диапазон цены, опубликован/черновик и "мои товары".
+Количество для всех значений всех фасетов считается одним запросом
+GROUP BY (категория, диапазон цены, опубликован, мой) и раскладывается
+в Python. Для каждого фасета учитываются все выбранные фильтры, кроме
+его собственного, поэтому счетчики показывают, сколько станет товаров
+после клика. Счетчики кэшируются по нормализованному набору фильтров.
+
+Без фильтров GROUP BY не выполняется: количество по категориям берется
+из CategoryStats, счетчики диапазонов цены не показываются.
+"""
+import hashlib
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, QuerySet, Value, When
+
+from .cache import CatalogCache, ProductRow
+from .models import CategoryStats, Product
+
+# Границы диапазонов цены (руб.): 0-500, 500-1000, ..., 50000+
+DEFAULT_PRICE_BUCKETS = (0, 500, 1000, 5000, 10000, 50000)
+
+
+def price_buckets() -> tuple:
+    return tuple(getattr(settings, 'CATALOG_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def bucket_label(index: int) -> str:
+    bounds = price_buckets()
+    if index + 1 < len(bounds):
+        return f'{bounds[index]}–{bounds[index + 1]} ₽'
+    return f'от {bounds[index]} ₽'
+
+
+class FacetFilters:
+    """Выбранные фильтры в нормализованном виде (порядок и дубликаты не важны)"""
+
+    def __init__(self, user, categories=(), prices=(), published: str = 'yes', mine: bool = False):
+        self.user = user
+        self.categories = tuple(sorted(set(categories)))
+        self.prices = tuple(sorted(set(prices)))
+        self.published = published
+        self.mine = mine
+
+    @classmethod
+    def from_request(cls, request) -> 'FacetFilters':
+        """Фильтры из ?category=&price=&published=&owner= (недопустимые значения отбрасываются)"""
+        user = request.user
+        slugs = {category.slug for category in CatalogCache.get_categories()}
+        prices = []
+        for value in request.GET.getlist('price'):
+            if value.isdigit() and int(value) < len(price_buckets()):
+                prices.append(int(value))
+
+        authenticated = user.is_authenticated
+        published = request.GET.get('published', 'yes')
+        # Черновики видят только персонал и владельцы
+        if published not in ('yes', 'no', 'any') or not authenticated:
+            published = 'yes'
+        return cls(
+            user,
+            categories=[slug for slug in request.GET.getlist('category') if slug in slugs],
+            prices=prices,
+            published=published,
+            mine=authenticated and request.GET.get('owner') == 'mine',
+        )
+
+    @property
+    def active(self) -> bool:
+        return bool(self.categories or self.prices or self.mine or self.published != 'yes')
+
+    @property
+    def scope(self) -> str:
+        """Чьи товары видны: от этого зависят и результаты, и счетчики"""
+        if self.user.is_staff:
+            return 'staff'
+        if self.user.is_authenticated:
+            return f'user:{self.user.pk}'
+        return 'anon'
+
+    def cache_digest(self, extra: str = '') -> str:
+        raw = repr((self.scope, self.categories, self.prices, self.published, self.mine, extra))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def visible(self) -> Q:
+        """Товары, которые пользователь может видеть"""
+        if self.user.is_staff:
+            return Q()
+        if self.user.is_authenticated:
+            return Q(is_published=True) | Q(owner_id=self.user.pk)
+        return Q(is_published=True)
+
+    def q(self, exclude: str = None) -> Q:
+        """Условие выбранных фильтров (кроме фасета exclude)"""
+        condition = self.visible()
+        if self.categories and exclude != 'category':
+            condition &= Q(category__slug__in=self.categories)
+        if self.prices and exclude != 'price':
+            bounds = price_buckets()
+            ranges = Q()
+            for index in self.prices:
+                part = Q(price__gte=bounds[index])
+                if index + 1 < len(bounds):
+                    part &= Q(price__lt=bounds[index + 1])
+                ranges |= part
+            condition &= ranges
+        if self.published != 'any' and exclude != 'published':
+            condition &= Q(is_published=self.published == 'yes')
+        if self.mine and exclude != 'owner':
+            condition &= Q(owner_id=self.user.pk)
+        return condition
+
+    def query_string(self, **changes) -> str:
+        """Параметры URL с изменениями (для ссылок фасетов)"""
+        state = {
+            'category': list(self.categories), 'price': list(self.prices),
+            'published': self.published, 'owner': 'mine' if self.mine else None,
+        }
+        state.update(changes)
+        parts = []
+        for slug in state['category']:
+            parts.append(f'category={slug}')
+        for index in state['price']:
+            parts.append(f'price={index}')
+        if state['published'] != 'yes':
+            parts.append(f"published={state['published']}")
+        if state['owner']:
+            parts.append('owner=mine')
+        return '&'.join(parts)
+
+
+def _toggle(values: tuple, value) -> list:
+    return [item for item in values if item != value] if value in values else list(values) + [value]
+
+
+def _grouped_counts(filters: FacetFilters, product_ids: Optional[List[int]]) -> Dict:
+    """Один GROUP BY по всем измерениям фасетов (простые структуры для кэша)"""
+    bounds = price_buckets()
+    qs = Product.objects.filter(filters.visible())
+    if product_ids is not None:
+        qs = qs.filter(pk__in=product_ids)
+
+    rows = qs.annotate(
+        bucket=Case(
+            *[When(price__lt=bounds[index + 1], then=Value(index)) for index in range(len(bounds) - 1)],
+            default=Value(len(bounds) - 1), output_field=IntegerField(),
+        ),
+        mine=Case(
+            When(owner_id=filters.user.pk, then=Value(1)),
+            default=Value(0), output_field=IntegerField(),
+        ) if filters.user.is_authenticated else Value(0, output_field=IntegerField()),
+    ).values_list('category__slug', 'bucket', 'is_published', 'mine').annotate(
+        count=Count('id')
+    ).order_by()
+    return [tuple(row) for row in rows]
+
+
+def _unfiltered_counts(filters: FacetFilters) -> Dict:
+    """
+    Счетчики без фильтров: опубликованные продукты по категориям из
+    CategoryStats (без агрегации по продуктам), для вошедших - еще
+    черновики и свои товары одним COUNT по их части каталога
+    """
+    categories = dict(
+        CategoryStats.objects.filter(published_count__gt=0)
+        .values_list('category__slug', 'published_count')
+    )
+    total = sum(categories.values())
+    counts = {'category': categories, 'price': None, 'published': {'yes': total}, 'owner': 0, 'total': total}
+
+    user = filters.user
+    if user.is_authenticated:
+        extra = Product.objects.filter(
+            filters.visible() & (Q(is_published=False) | Q(owner_id=user.pk))
+        ).aggregate(
+            drafts=Count('id', filter=Q(is_published=False)),
+            mine=Count('id', filter=Q(is_published=True, owner_id=user.pk)),
+        )
+        counts['published']['no'] = extra['drafts']
+        counts['owner'] = extra['mine']
+    return counts
+
+
+def facet_counts(filters: FacetFilters, product_ids: Optional[List[int]] = None,
+                 cache_extra: str = '') -> Dict:
+    """Счетчики всех фасетов (кэшируются по набору фильтров)"""
+    if product_ids is None and not filters.active:
+        return _unfiltered_counts(filters)
+
+    def compute():
+        groups = _grouped_counts(filters, product_ids)
+
+        def matches(row, exclude):
+            slug, bucket, is_published, mine = row[:4]
+            if filters.categories and exclude != 'category' and slug not in filters.categories:
+                return False
+            if filters.prices and exclude != 'price' and bucket not in filters.prices:
+                return False
+            if filters.published != 'any' and exclude != 'published' \
+                    and is_published != (filters.published == 'yes'):
+                return False
+            if filters.mine and exclude != 'owner' and not mine:
+                return False
+            return True
+
+        counts = {'category': {}, 'price': {}, 'published': {}, 'owner': 0, 'total': 0}
+        for row in groups:
+            slug, bucket, is_published, mine, count = row
+            if matches(row, 'category'):
+                counts['category'][slug] = counts['category'].get(slug, 0) + count
+            if matches(row, 'price'):
+                counts['price'][bucket] = counts['price'].get(bucket, 0) + count
+            if matches(row, 'published'):
+                key = 'yes' if is_published else 'no'
+                counts['published'][key] = counts['published'].get(key, 0) + count
+            if mine and matches(row, 'owner'):
+                counts['owner'] += count
+            if matches(row, None):
+                counts['total'] += count
+        return counts
+
+    return CatalogCache._fetch(
+        'facets', CatalogCache._key('facets', digest=filters.cache_digest(cache_extra)), compute,
+    )
+
+
+def build_facets(filters: FacetFilters, counts: Dict, base_query: str = '') -> Dict:
+    """Фасеты для шаблона: подписи, счетчики, выбранность и ссылки"""
+    def link(**changes):
+        query = filters.query_string(**changes)
+        return '?' + '&'.join(part for part in (base_query, query) if part)
+
+    categories = [
+        {
+            'label': category.name,
+            'count': counts['category'].get(category.slug, 0),
+            'active': category.slug in filters.categories,
+            'url': link(category=_toggle(filters.categories, category.slug)),
+        }
+        for category in CatalogCache.get_categories()
+        if counts['category'].get(category.slug) or category.slug in filters.categories
+    ]
+    # None - счетчики диапазонов не считались (страница без фильтров)
+    price_counts = counts['price']
+    prices = [
+        {
+            'label': bucket_label(index),
+            'count': None if price_counts is None else price_counts.get(index, 0),
+            'active': index in filters.prices,
+            'url': link(price=_toggle(filters.prices, index)),
+        }
+        for index in range(len(price_buckets()))
+        if price_counts is None or price_counts.get(index) or index in filters.prices
+    ]
+    facets = {'total': counts['total'], 'category': categories, 'price': prices,
+              'reset_url': '?' + base_query}
+    if filters.user.is_authenticated:
+        facets['published'] = [
+            {
+                'label': label,
+                'count': sum(counts['published'].values()) if value == 'any'
+                else counts['published'].get(value, 0),
+                'active': filters.published == value,
+                'url': link(published=value),
+            }
+            for value, label in (('yes', 'Опубликованные'), ('no', 'Черновики'), ('any', 'Все'))
+        ]
+        facets['owner'] = {
+            'label': 'Мои товары',
+            'count': counts['owner'],
+            'active': filters.mine,
+            'url': link(owner=None if filters.mine else 'mine'),
+        }
+    return facets
+
+
+def filter_queryset(filters: FacetFilters) -> QuerySet:
+    """Продукты, подходящие под все выбранные фильтры"""
+    return Product.objects.filter(filters.q())
+
+
+def load_products(ids: List[int]) -> List:
+    """
+    Продукты по ID в заданном порядке: опубликованные - пачкой из кэша,
+    черновики (их нет в кэше) - одним запросом к БД.
+    """
+    products = {product.id: product for product in CatalogCache.get_products_info(ids)}
+    missing = [pk for pk in ids if pk not in products]
+    if missing:
+        for row in ProductRow.card_values(Product.objects.filter(pk__in=missing)):
+            products[row[0]] = ProductRow(ProductRow.pack(row))
+    return [products[pk] for pk in ids if pk in products]
@@ -0,0 +1,70 @@
+"""
+Кэш HTML-фрагментов карточек продуктов.
+
+Карточка рендерится без пользователя и кэшируется в семействе card_html
+CatalogCache по ключу (id, поколение продукта), поэтому фрагмент один
+для всех посетителей; все карточки страницы читаются одним get_many.
+Части, которые зависят от пользователя (отметка "Ваш", кнопки изменения
+и удаления), подставляются в метки фрагмента уже после чтения из кэша.
+"""
+from typing import List
+
+from django.contrib.auth.context_processors import PermWrapper
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import SafeString, mark_safe
+
+from .cache import CatalogCache
+
+CARD_TEMPLATE = 'catalog/includes/product_card.html'
+ACTIONS_TEMPLATE = 'catalog/includes/product_card_actions.html'
+
+# Метки во фрагменте для частей, зависящих от пользователя
+OWNER_SLOT = '<!--card:owner-->'
+ACTIONS_SLOT = '<!--card:actions-->'
+OWNER_BADGE = '<span class="badge bg-warning ms-1">Ваш</span>'
+
+
+def _card_keys(products) -> List[str]:
+    """
+    Ключи фрагментов (поколения всех продуктов - одним запросом).
+    Переименование категории или смена владельца меняют поколения
+    продуктов (см. signals), поэтому устаревшая карточка перестает читаться.
+    """
+    return CatalogCache._keys('card_html', [{'id': product.pk} for product in products])
+
+
+def render_product_cards(request, products) -> List[SafeString]:
+    """HTML карточек страницы: один get_many, промахи - один set_many"""
+    products = list(products)
+    if not products:
+        return []
+
+    keys = _card_keys(products)
+    cached = cache.get_many(keys)
+    CatalogCache._count('card_html', 'hit', len(cached))
+
+    missing = {}
+    for product, key in zip(products, keys):
+        if key not in cached:
+            # Без request и user: во фрагмент не попадает ничего личного
+            cached[key] = missing[key] = render_to_string(CARD_TEMPLATE, {'product': product})
+    if missing:
+        cache.set_many(missing, CatalogCache._ttl('card_html'))
+        CatalogCache._count('card_html', 'miss', len(missing))
+        CatalogCache._count('card_html', 'stores', len(missing))
+        CatalogCache._count('card_html', 'bytes', sum(len(html.encode()) for html in missing.values()))
+
+    user = request.user
+    perms = PermWrapper(user) if user.is_authenticated else None
+    can_delete = user.is_authenticated and user.has_perm('catalog.delete_product')
+    cards = []
+    for product, key in zip(products, keys):
+        is_owner = user.is_authenticated and product.owner == user
+        # Кнопки рендерятся только там, где они есть
+        actions = render_to_string(
+            ACTIONS_TEMPLATE, {'product': product, 'is_owner': is_owner, 'perms': perms},
+        ) if is_owner or can_delete else ''
+        html = cached[key].replace(OWNER_SLOT, OWNER_BADGE if is_owner else '').replace(ACTIONS_SLOT, actions)
+        cards.append(mark_safe(html))
+    return cards
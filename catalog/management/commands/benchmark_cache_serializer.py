@@ -0,0 +1,94 @@
+import pickle
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog.cache import CatalogCache, ProductRow, CategoryRow
+from catalog.cache_serializer import CacheSerializer, to_decimal_str
+from catalog.models import Product, Category
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает сериализатор кэша каталога с pickle по размеру и скорости'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000,
+                            help='Количество продуктов в списке (по умолчанию 10000)')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Количество повторов каждого замера')
+
+    def handle(self, *args, **options):
+        # Синтетические объекты без обращения к БД
+        now = timezone.now()
+        owner = User(id=1, email='owner@example.com')
+        category = Category(id=1, name='Электроника', slug='elektronika',
+                            description='Смартфоны, ноутбуки, планшеты')
+        products = [
+            Product(
+                id=i, name=f'Продукт {i}', description='Описание синтетического продукта ' * 4,
+                image=f'products/2025/01/01/{i}.jpg', category=category, owner=owner,
+                price=Decimal(i % 1000) + Decimal('0.99'), created_at=now, updated_at=now,
+                is_published=True,
+            )
+            for i in range(1, options['rows'] + 1)
+        ]
+
+        def detail_row(product):
+            return (product.id, product.name, product.price, product.description,
+                    product.image.name, product.created_at, product.is_published,
+                    category.id, category.name, category.slug, owner.id, owner.email,
+                    product.updated_at)
+
+        stats = {'count': 5, 'avg_price': Decimal('512.99'), 'max_price': Decimal('999.99'),
+                 'min_price': Decimal('0.99')}
+
+        # (название, как хранилось раньше - pickle, как хранится теперь - простые структуры)
+        cases = [
+            ('product_detail', products[0], ProductRow.pack(detail_row(products[0]))),
+            (
+                'category_detail',
+                {'category': category, 'stats': stats, 'recent': products[:5]},
+                {
+                    'category': tuple(getattr(category, f) for f in CategoryRow.FIELDS),
+                    'stats': {k: v if k == 'count' else to_decimal_str(v) for k, v in stats.items()},
+                    'recent': [ProductRow.pack(detail_row(p)) for p in products[:5]],
+                },
+            ),
+            (
+                f'products_list ({len(products)})',
+                [detail_row(p) for p in products],
+                [ProductRow.pack(detail_row(p)) for p in products],
+            ),
+        ]
+
+        plain = CacheSerializer(compress_threshold=0)
+        compressed = CatalogCache.serializer
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'значение':<22} {'формат':<14} {'размер, Б':>10} "
+                          f"{'запись, мкс':>12} {'чтение, мкс':>12}")
+        for name, old_value, new_value in cases:
+            formats = [
+                ('pickle', lambda v: pickle.dumps(v, pickle.HIGHEST_PROTOCOL), pickle.loads, old_value),
+                ('codec', plain.dumps, plain.loads, new_value),
+                ('codec+zlib', compressed.dumps, compressed.loads, new_value),
+            ]
+            for label, dumps, loads, value in formats:
+                payload = dumps(value)
+                dump_us = self._timeit(lambda: dumps(value), repeat)
+                load_us = self._timeit(lambda: loads(payload), repeat)
+                self.stdout.write(f'{name:<22} {label:<14} {len(payload):>10} '
+                                  f'{dump_us:>12.1f} {load_us:>12.1f}')
+
+    @staticmethod
+    def _timeit(func, repeat):
+        """Среднее время вызова в микросекундах"""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1_000_000
@@ -0,0 +1,86 @@
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from catalog.cache import CatalogCache
+from catalog.models import Product, Category
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает режимы кэша списка продуктов (ids и rows) на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000,
+                            help='Количество синтетических продуктов (по умолчанию 100000)')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Количество повторов чтения из кэша')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки для bulk_create')
+
+    def handle(self, *args, **options):
+        # Все данные создаются внутри транзакции и откатываются в конце
+        with transaction.atomic():
+            self._fill(options['products'], options['batch_size'])
+
+            results = []
+            for mode in ('ids', 'rows'):
+                with override_settings(CATALOG_CACHE_MODE=mode):
+                    results.append(self._measure(mode, options['runs']))
+
+            transaction.set_rollback(True)
+
+        cache.delete(CatalogCache._key('products_all'))
+
+        self.stdout.write('')
+        self.stdout.write(f"{'режим':<6} {'промах, мс':>12} {'попадание, мс':>14} "
+                          f"{'запросов':>9} {'размер, КБ':>11}")
+        for mode, miss_ms, hit_ms, queries, size in results:
+            self.stdout.write(f'{mode:<6} {miss_ms:>12.1f} {hit_ms:>14.1f} '
+                              f'{queries:>9} {size / 1024:>11.1f}')
+
+    def _fill(self, count, batch_size):
+        """Создание синтетического каталога"""
+        category = Category.objects.create(name='Benchmark', description='Синтетические данные')
+        self.stdout.write(f'Создание {count} продуктов...')
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                Product(
+                    name=f'Продукт {i}',
+                    description='Описание синтетического продукта ' * 4,
+                    category=category,
+                    price=Decimal(i % 1000) + Decimal('0.99'),
+                )
+                for i in range(start, min(start + batch_size, count))
+            )
+
+    def _measure(self, mode, runs):
+        """Замер промаха и попаданий для одного режима"""
+        key = CatalogCache._key('products_all')
+        cache.delete(key)
+
+        started = time.perf_counter()
+        len(CatalogCache.get_products())
+        miss_ms = (time.perf_counter() - started) * 1000
+
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        hit_total = 0.0
+        with connection.execute_wrapper(count_queries):
+            for _ in range(runs):
+                started = time.perf_counter()
+                # Обращаемся к связанным полям, как это делают шаблоны
+                for product in CatalogCache.get_products():
+                    product.category.name
+                hit_total += time.perf_counter() - started
+
+        size = len(cache.get(key))
+        self.stdout.write(f'{mode}: готово')
+        return mode, miss_ms, hit_total / runs * 1000, len(queries) // runs, size
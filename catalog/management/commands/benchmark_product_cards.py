@@ -0,0 +1,117 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from catalog.cache import CatalogCache, ProductRow
+from catalog.models import Product, Category
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает объем страницы списка: полные строки Product и проекцию карточки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000,
+                            help='Количество синтетических продуктов (по умолчанию 1000)')
+        parser.add_argument('--per-page', type=int, default=12,
+                            help='Размер страницы списка')
+        parser.add_argument('--description-length', type=int, default=2000,
+                            help='Длина описания синтетического продукта')
+        parser.add_argument('--runs', type=int, default=50,
+                            help='Количество повторов каждого замера')
+
+    def handle(self, *args, **options):
+        per_page, runs = options['per_page'], options['runs']
+
+        # Все данные создаются внутри транзакции и откатываются в конце
+        with transaction.atomic():
+            self._fill(options['products'], options['description_length'])
+
+            published = Product.objects.filter(is_published=True).order_by('-created_at', 'id')
+            variants = [
+                ('model', published.select_related('category', 'owner')),
+                ('only', ProductRow.card_objects(published)),
+                ('card', ProductRow.card_values(published)),
+            ]
+            results = [
+                (name, self._wire_bytes(queryset[:per_page]), self._build_ms(queryset[:per_page], runs))
+                for name, queryset in variants
+            ]
+
+            page = list(published[:per_page])
+            cache_sizes = {
+                'product_detail': self._cache_bytes(page, card=False),
+                'product_card': self._cache_bytes(page, card=True),
+            }
+
+            transaction.set_rollback(True)
+
+        self.stdout.write('')
+        self.stdout.write(f"{'выборка':<8} {'из БД, Б/стр.':>14} {'построение, мс':>15}")
+        for name, size, build_ms in results:
+            self.stdout.write(f'{name:<8} {size:>14} {build_ms:>15.3f}')
+
+        self.stdout.write('')
+        for name, size in cache_sizes.items():
+            self.stdout.write(f'{name:<15} в кэше: {size} Б/стр.')
+
+        full, card = results[0][1], results[-1][1]
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Карточка: {card} Б вместо {full} Б на страницу '
+            f'(-{100 - card * 100 / full if full else 0:.0f}%)'
+        ))
+
+    def _fill(self, count, description_length):
+        """Создание синтетического каталога"""
+        owner = User.objects.create(email='benchmark-cards@example.com')
+        category = Category.objects.create(name='Benchmark', description='Синтетические данные')
+        # Случайный текст: повторяющаяся строка сжималась бы в кэше неправдоподобно хорошо
+        rng = random.Random(0)
+        words = ['экран', 'корпус', 'батарея', 'гарантия', 'доставка', 'модель', 'память',
+                 'камера', 'процессор', 'комплект', 'размер', 'цвет', 'вес', 'материал']
+
+        def description():
+            text = ' '.join(rng.choice(words) + str(rng.randint(0, 999))
+                            for _ in range(description_length // 8))
+            return text[:description_length]
+
+        self.stdout.write(f'Создание {count} продуктов...')
+        Product.objects.bulk_create(
+            Product(
+                name=f'Продукт {i}', description=description(), category=category, owner=owner,
+                image=f'products/2025/01/01/{i}.jpg',
+                price=Decimal(i % 1000) + Decimal('0.99'), is_published=True,
+            )
+            for i in range(count)
+        )
+
+    @staticmethod
+    def _wire_bytes(queryset):
+        """Объем строк, которые БД возвращает для страницы (сумма значений колонок)"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return sum(len(str(value).encode()) for row in rows for value in row if value is not None)
+
+    @staticmethod
+    def _build_ms(queryset, runs):
+        """Среднее время запроса и построения объектов страницы"""
+        started = time.perf_counter()
+        for _ in range(runs):
+            list(queryset.all())
+        return (time.perf_counter() - started) / runs * 1000
+
+    @staticmethod
+    def _cache_bytes(page, card):
+        """Размер записей кэша для продуктов страницы"""
+        rows = CatalogCache._compute_products_info([product.id for product in page], card=card)
+        return sum(
+            len(CatalogCache.serializer.dumps(CatalogCache._envelope('product_card', row, 0)))
+            for row in rows.values()
+        )
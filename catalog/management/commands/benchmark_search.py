@@ -0,0 +1,87 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from catalog.models import Product, Category
+from catalog.search import PostgresSearchBackend, SimpleSearchBackend
+from catalog.search_engine import InMemorySearchBackend, SearchEngine
+
+WORDS = (
+    'телефон', 'смартфон', 'ноутбук', 'планшет', 'наушники', 'книга', 'роман', 'детектив',
+    'черный', 'белый', 'красный', 'новый', 'быстрый', 'легкий', 'большой', 'компактный',
+    'phone', 'laptop', 'tablet', 'wireless', 'headphones', 'book', 'classic', 'pro',
+    'экран', 'батарея', 'память', 'камера', 'процессор', 'обложка', 'страницы', 'автор',
+)
+QUERIES = (
+    'телефон', 'черный смартфон', 'книги', 'wireless headphones', 'новые ноутбуки',
+    'камера', 'роман автор', 'laptop pro', 'быстрого процессора', 'компактные наушники',
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает бэкенды поиска (индекс в памяти и БД) на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000,
+                            help='Количество синтетических продуктов (по умолчанию 100000)')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Количество повторов каждого запроса')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки для bulk_create')
+
+    def handle(self, *args, **options):
+        db_backend = (PostgresSearchBackend() if connection.vendor == 'postgresql'
+                      else SimpleSearchBackend())
+
+        # Все данные создаются внутри транзакции и откатываются в конце
+        with transaction.atomic():
+            self._fill(options['products'], options['batch_size'])
+
+            engine = SearchEngine()
+            started = time.perf_counter()
+            engine.build_from_db()
+            build_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(f'Индекс в памяти построен за {build_ms:.0f} мс: {engine.stats()}')
+
+            results = [
+                self._measure('memory', InMemorySearchBackend(engine), options['runs']),
+                self._measure(type(db_backend).__name__, db_backend, options['runs']),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write('')
+        self.stdout.write(f"{'бэкенд':<22} {'среднее, мс':>12} {'макс, мс':>10} {'результатов':>12}")
+        for name, avg_ms, max_ms, found in results:
+            self.stdout.write(f'{name:<22} {avg_ms:>12.2f} {max_ms:>10.2f} {found:>12}')
+
+    def _fill(self, count, batch_size):
+        """Создание синтетического каталога из случайных слов"""
+        category = Category.objects.create(name='Benchmark search', description='Синтетические данные')
+        rnd = random.Random(42)
+        self.stdout.write(f'Создание {count} продуктов...')
+        for start in range(0, count, batch_size):
+            Product.objects.bulk_create(
+                Product(
+                    name=' '.join(rnd.choices(WORDS, k=3)),
+                    description=' '.join(rnd.choices(WORDS, k=20)),
+                    category=category,
+                    price=Decimal(i % 1000) + Decimal('0.99'),
+                )
+                for i in range(start, min(start + batch_size, count))
+            )
+
+    @staticmethod
+    def _measure(name, backend, runs):
+        """Среднее и максимальное время запросов одного бэкенда"""
+        timings = []
+        found = 0
+        for query in QUERIES:
+            for _ in range(runs):
+                started = time.perf_counter()
+                ids = backend.search(query, limit=50)
+                timings.append((time.perf_counter() - started) * 1000)
+            found += len(ids)
+        return name, sum(timings) / len(timings), max(timings), found
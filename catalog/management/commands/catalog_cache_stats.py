@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from catalog.cache import CatalogCache
+
+
+class Command(BaseCommand):
+    help = 'Показывает счетчики кэша каталога по семействам ключей (для подбора TTL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON')
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        report = CatalogCache.report()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(
+                f"{'семейство':<18} {'TTL':>6} {'чтений':>8} {'попад.':>7} {'промах':>7} "
+                f"{'устар.':>7} {'пересч., мс':>12} {'размер, Б':>10} {'вытесн.':>8}"
+            )
+            for key_name, family in report['families'].items():
+                self.stdout.write(
+                    f"{key_name:<18} {family['ttl']:>6} {family['reads']:>8} "
+                    f"{family['hit_ratio']:>7.1%} {family['miss']:>7} {family['stale']:>7} "
+                    f"{family['avg_recompute_ms']:>12} {family['avg_payload_bytes']:>10} "
+                    f"{family['evictions']:>8}"
+                )
+
+            layers = report['layers']
+            self.stdout.write('')
+            self.stdout.write(f"L1 (этот процесс): {layers['l1']['hit_ratio']:.1%} попаданий")
+            self.stdout.write(f"L2 (Redis): {layers['l2']['hit_ratio']:.1%} попаданий")
+
+        if options['reset']:
+            CatalogCache.reset_metrics()
+            self.stdout.write(self.style.SUCCESS('✅ Счетчики обнулены'))
@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.export import CatalogExport
+
+
+class Command(BaseCommand):
+    help = 'Выгружает продукты с категорией и email владельца в CSV или JSONL (потоком, постоянная память)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(CatalogExport.FORMATS), default='csv',
+                            help='Формат файла (по умолчанию csv)')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать gzip на лету')
+        parser.add_argument('--published', action='store_true',
+                            help='Только опубликованные продукты')
+        parser.add_argument('--output', '-o', default='-',
+                            help='Путь к файлу (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Строк за одно чтение серверного курсора')
+
+    def handle(self, *args, **options):
+        export = CatalogExport(
+            options['format'], compress=options['gzip'],
+            published_only=options['published'], chunk_size=options['chunk_size'],
+        )
+
+        started = time.monotonic()
+        to_stdout = options['output'] == '-'
+        output = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        try:
+            written = 0
+            for block in export:
+                output.write(block)
+                written += len(block)
+        finally:
+            if to_stdout:
+                output.flush()
+            else:
+                output.close()
+
+        if not to_stdout:
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Выгружено {export.count} продуктов в {options["output"]}: '
+                f'{written / 1024:.1f} КБ за {elapsed:.1f} с'
+            ))
@@ -1,10 +1,13 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from catalog.models import Product, Category
 
 class Command(BaseCommand):
     help = 'Заполнение базы данных тестовыми продуктами (очищает существующие данные)'
 
+    @transaction.atomic
     def handle(self, *args, **options):
+        # Одна транзакция - кэш каталога сбрасывается один раз после коммита
 
         # Удаляем все существующие продукты и категории
         Product.objects.all().delete()
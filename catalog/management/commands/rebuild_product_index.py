@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.cache import CatalogCache
+from catalog.product_index import ProductIndex
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс продуктов в сортированных множествах Redis'
+
+    def handle(self, *args, **options):
+        if CatalogCache._redis() is None:
+            self.stdout.write(self.style.WARNING(
+                '⚠️ Кэш работает не на Redis - индекс не используется, списки читаются из кэша'
+            ))
+            return
+
+        started = time.monotonic()
+        count = ProductIndex.rebuild()
+        if count is None:
+            self.stdout.write(self.style.WARNING('⚠️ Индекс уже перестраивает другой процесс'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Индекс перестроен: {count} продуктов за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from catalog import stats_snapshot
+from catalog.cache import CatalogCache
+
+
+class Command(BaseCommand):
+    help = ('Обновляет материализованную статистику каталога, если с прошлого запуска '
+            'были изменения (запускайте по расписанию, например раз в минуту)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересчитать снимок, даже если изменений не было')
+
+    def handle(self, *args, **options):
+        snapshot, refreshed = stats_snapshot.refresh(force=options['force'])
+        if not refreshed:
+            self.stdout.write(
+                f'Изменений нет, снимок от {snapshot.refreshed_at:%d.%m.%Y %H:%M:%S} актуален'
+            )
+            return
+
+        # Кэш get_stats зависит только от снимка
+        CatalogCache.invalidate_namespaces('stats')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Снимок обновлен за {snapshot.refresh_duration_ms:.1f} мс: '
+            f'{snapshot.total_products} продуктов, отставание {snapshot.staleness_seconds:.0f} с'
+        ))
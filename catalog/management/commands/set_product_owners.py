@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from catalog.models import Product
 
 User = get_user_model()
@@ -23,9 +24,11 @@ class Command(BaseCommand):
         products_without_owner = Product.objects.filter(owner__isnull=True)
         count = products_without_owner.count()
 
-        for product in products_without_owner:
-            product.owner = admin_user
-            product.save()
+        # Одна транзакция - кэш каталога сбрасывается один раз после коммита
+        with transaction.atomic():
+            for product in products_without_owner:
+                product.owner = admin_user
+                product.save()
 
         self.stdout.write(
             self.style.SUCCESS(f'✅ Установлен владелец для {count} продуктов')
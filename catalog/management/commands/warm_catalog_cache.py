@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from catalog.cache import CatalogCache
+from catalog.models import Product, Category
+
+
+class Command(BaseCommand):
+    help = 'Прогревает кэш каталога после деплоя или перезапуска Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Количество потоков (по умолчанию 4)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько ключей записывать одним set_many (по умолчанию 500)')
+        parser.add_argument('--families', nargs='+', choices=list(CatalogCache.KEYS),
+                            default=list(CatalogCache.KEYS),
+                            help='Какие семейства ключей прогревать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        tasks = self._tasks(options['families'], options['batch_size'])
+        total_keys = sum(len(params_list) for _, params_list in tasks)
+        self.stdout.write(
+            f'Прогрев: {len(tasks)} пачек, {total_keys} ключей, '
+            f'{options["concurrency"]} потоков'
+        )
+
+        started = time.monotonic()
+        written = 0
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futures = {
+                pool.submit(self._warm, key_name, params_list): key_name
+                for key_name, params_list in tasks
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                written += future.result()
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'[{done}/{len(tasks)}] {futures[future]}: '
+                    f'записано {written} ключей, {written / elapsed:.0f} ключей/с'
+                )
+
+        CatalogCache.flush_metrics()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Кэш прогрет: {written} ключей за {elapsed:.1f} с '
+            f'({written / elapsed if elapsed else written:.0f} ключей/с)'
+        ))
+
+    @staticmethod
+    def _tasks(families, batch_size):
+        """Пачки (семейство, список параметров) для пула потоков"""
+        tasks = []
+        slugs = list(Category.objects.exclude(slug='').values_list('slug', flat=True))
+
+        for key_name in families:
+            template = CatalogCache.KEYS[key_name][0]
+            if '{digest}' in template or key_name == 'card_html':
+                # Подсказки и HTML карточек заполняются по запросам пользователей
+                continue
+            if '{slug}' in template:
+                params = [{'slug': slug} for slug in slugs]
+            elif '{id}' in template:
+                ids = Product.objects.filter(is_published=True).values_list('id', flat=True)
+                params = [{'id': pk} for pk in ids.iterator()]
+            else:
+                params = [{}]
+
+            for start in range(0, len(params), batch_size):
+                tasks.append((key_name, params[start:start + batch_size]))
+        return tasks
+
+    @staticmethod
+    def _warm(key_name, params_list):
+        """Прогреть одну пачку в отдельном потоке"""
+        try:
+            return CatalogCache.warm(key_name, params_list)
+        finally:
+            # У каждого потока свое соединение с БД - закрываем его
+            connections.close_all()
@@ -0,0 +1,34 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .cache import end_request_memo, start_request_memo
+
+
+class CatalogCacheMemoMiddleware:
+    """
+    Мемоизация вызовов CatalogCache на время запроса: повторные
+    get_products()/get_categories() из view, шаблонов и шапки сайта
+    не ходят в Redis второй раз. Работает и в WSGI, и в ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = start_request_memo()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_memo(token)
+
+    async def __acall__(self, request):
+        token = start_request_memo()
+        try:
+            return await self.get_response(request)
+        finally:
+            end_request_memo(token)
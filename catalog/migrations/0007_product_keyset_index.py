@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_alter_category_options_alter_product_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', 'name', 'id'], name='catalog_product_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:57
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вектор: название с весом A, описание с весом B, словари russian и english
+VECTOR_SQL = '''
+    setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B')
+'''
+
+FORWARD_SQL = [
+    '''
+    CREATE OR REPLACE FUNCTION catalog_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := %s;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''' % VECTOR_SQL.format(row='NEW.'),
+    '''
+    CREATE TRIGGER catalog_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON catalog_product
+    FOR EACH ROW EXECUTE FUNCTION catalog_product_search_vector_update()
+    ''',
+    'UPDATE catalog_product SET search_vector = %s' % VECTOR_SQL.format(row=''),
+    'CREATE INDEX catalog_product_search_gin ON catalog_product USING gin (search_vector)',
+]
+
+BACKWARD_SQL = [
+    'DROP INDEX IF EXISTS catalog_product_search_gin',
+    'DROP TRIGGER IF EXISTS catalog_product_search_vector_trigger ON catalog_product',
+    'DROP FUNCTION IF EXISTS catalog_product_search_vector_update()',
+]
+
+
+def _run(statements):
+    """Триггер и GIN-индекс есть только в PostgreSQL"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(_run(FORWARD_SQL), _run(BACKWARD_SQL)),
+    ]
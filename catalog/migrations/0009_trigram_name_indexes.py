@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Триграммные GIN-индексы ускоряют name ILIKE '%...%' для автодополнения
+FORWARD_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS catalog_product_name_trgm '
+    'ON catalog_product USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS catalog_category_name_trgm '
+    'ON catalog_category USING gin (name gin_trgm_ops)',
+]
+
+BACKWARD_SQL = [
+    'DROP INDEX IF EXISTS catalog_category_name_trgm',
+    'DROP INDEX IF EXISTS catalog_product_name_trgm',
+]
+
+
+def _run(statements):
+    """Расширение pg_trgm есть только в PostgreSQL"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(BACKWARD_SQL)),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:04
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fill_stats(apps, schema_editor):
+    """Начальное заполнение статистики одним GROUP BY"""
+    Product = apps.get_model('catalog', 'Product')
+    CategoryStats = apps.get_model('catalog', 'CategoryStats')
+    db = schema_editor.connection.alias
+    rows = Product.objects.using(db).filter(is_published=True).values('category_id').annotate(
+        count=Count('id'), total=Sum('price'), low=Min('price'), high=Max('price'),
+    ).order_by()
+    CategoryStats.objects.using(db).bulk_create([
+        CategoryStats(
+            category_id=row['category_id'], published_count=row['count'],
+            price_sum=row['total'] or Decimal('0'), min_price=row['low'], max_price=row['high'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_trigram_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='catalog.category', verbose_name='Категория')),
+                ('published_count', models.PositiveIntegerField(default=0, verbose_name='Опубликовано продуктов')),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Сумма цен')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена')),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная цена')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Статистика категории',
+                'verbose_name_plural': 'Статистика категорий',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
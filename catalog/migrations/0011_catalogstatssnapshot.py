@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_categorystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_products', models.PositiveIntegerField(default=0, verbose_name='Опубликовано продуктов')),
+                ('avg_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Средняя цена')),
+                ('categories_count', models.PositiveIntegerField(default=0, verbose_name='Категорий с продуктами')),
+                ('top_categories', models.JSONField(default=list, help_text='Список пар [ID категории, количество продуктов]', verbose_name='Популярные категории')),
+                ('watermark', models.DateTimeField(blank=True, help_text='Максимальный CategoryStats.updated_at на момент обновления', null=True, verbose_name='Последнее учтенное изменение')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Дата снимка')),
+                ('checked_at', models.DateTimeField(verbose_name='Дата последней проверки')),
+                ('refresh_duration_ms', models.FloatField(default=0, verbose_name='Длительность обновления, мс')),
+                ('staleness_seconds', models.FloatField(default=0, help_text='Сколько самое старое учтенное изменение ждало обновления', verbose_name='Отставание, с')),
+            ],
+            options={
+                'verbose_name': 'Снимок статистики каталога',
+                'verbose_name_plural': 'Снимки статистики каталога',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_catalogstatssnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', 'name', 'id'], name='catalog_pub_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-created_at', 'name', 'id'], name='catalog_pub_cat_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', 'price', 'id'], name='catalog_pub_cat_price_idx'),
+        ),
+    ]
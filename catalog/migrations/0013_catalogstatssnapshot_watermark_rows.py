@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_published_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogstatssnapshot',
+            name='watermark_rows',
+            field=models.PositiveIntegerField(default=0, help_text='Число строк CategoryStats: меняется при удалении категории', verbose_name='Строк статистики при обновлении'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:48
+
+from django.db import migrations
+
+# catalog_product_keyset_idx (0007) и catalog_pub_new_idx (0012) построены по одним
+# колонкам (-created_at, name, id). Все списки с курсором выбирают только
+# опубликованные продукты, поэтому остается частичный индекс WHERE is_published:
+# он меньше и не обновляется при сохранении черновиков
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_catalogstatssnapshot_watermark_rows'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='catalog_product_keyset_idx',
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, router, transaction
+from django.db.models import Q
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 import uuid  # Добавляем импорт для генерации уникальных идентификаторов
@@ -127,6 +131,14 @@ class Product(models.Model):
         help_text='Отображается ли продукт на сайте'
     )
 
+    # Полнотекстовый вектор (название + описание) для поиска в PostgreSQL.
+    # Заполняется триггером БД, GIN-индекс создается миграцией 0008
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
     # Поле владельца продукта
     owner = models.ForeignKey(
         User,
@@ -141,6 +153,12 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} ({self.price} руб.)"
 
+    def save(self, *args, **kwargs):
+        """Сохранение вместе с обновлением CategoryStats в одной транзакции"""
+        using = kwargs.get('using') or router.db_for_write(Product, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """Получение абсолютного URL продукта"""
         from django.urls import reverse
@@ -158,9 +176,137 @@ class Product(models.Model):
             models.Index(fields=['name']),  # Индекс для поиска по имени
             models.Index(fields=['category', 'is_published']),  # Индекс для фильтрации
             models.Index(fields=['price']),  # Индекс для сортировки по цене
+            # Частичные индексы публичного каталога (WHERE is_published): меньше
+            # и точно повторяют порядок списков, общего и по категории.
+            # catalog_pub_new_idx - и индекс пагинации по курсору (Meta.ordering + id):
+            # все списки с курсором показывают только опубликованные продукты
+            models.Index(fields=['-created_at', 'name', 'id'], condition=Q(is_published=True),
+                         name='catalog_pub_new_idx'),
+            models.Index(fields=['category', '-created_at', 'name', 'id'], condition=Q(is_published=True),
+                         name='catalog_pub_cat_new_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=Q(is_published=True),
+                         name='catalog_pub_cat_price_idx'),
         ]
         permissions = [
             ("can_unpublish_product", "Может отменять публикацию продукта"),
             ("can_change_publish_status", "Может изменять статус публикации"),
             ("can_view_statistics", "Может просматривать статистику"),
         ]
+
+
+class CategoryStats(models.Model):
+    """
+    Денормализованная статистика опубликованных продуктов категории.
+    Обновляется в той же транзакции, что и продукт (catalog.category_stats);
+    восстановление: manage.py rebuild_category_stats
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Категория'
+    )
+    published_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Опубликовано продуктов'
+    )
+    price_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма цен'
+    )
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Минимальная цена'
+    )
+    max_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Максимальная цена'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата пересчета'
+    )
+
+    def __str__(self):
+        return f"{self.category_id}: {self.published_count} шт."
+
+    @property
+    def avg_price(self):
+        """Средняя цена опубликованных продуктов"""
+        if not self.published_count:
+            return None
+        return (Decimal(self.price_sum) / self.published_count).quantize(Decimal('0.01'))
+
+    class Meta:
+        verbose_name = 'Статистика категории'
+        verbose_name_plural = 'Статистика категорий'
+
+
+class CatalogStatsSnapshot(models.Model):
+    """
+    Материализованная статистика каталога (одна строка).
+    Обновляется командой refresh_catalog_stats по CategoryStats,
+    а не агрегацией по всем продуктам.
+    """
+    total_products = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Опубликовано продуктов'
+    )
+    avg_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Средняя цена'
+    )
+    categories_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Категорий с продуктами'
+    )
+    top_categories = models.JSONField(
+        default=list,
+        verbose_name='Популярные категории',
+        help_text='Список пар [ID категории, количество продуктов]'
+    )
+    watermark = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последнее учтенное изменение',
+        help_text='Максимальный CategoryStats.updated_at на момент обновления'
+    )
+    watermark_rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Строк статистики при обновлении',
+        help_text='Число строк CategoryStats: меняется при удалении категории'
+    )
+    refreshed_at = models.DateTimeField(
+        verbose_name='Дата снимка'
+    )
+    checked_at = models.DateTimeField(
+        verbose_name='Дата последней проверки'
+    )
+    refresh_duration_ms = models.FloatField(
+        default=0,
+        verbose_name='Длительность обновления, мс'
+    )
+    staleness_seconds = models.FloatField(
+        default=0,
+        verbose_name='Отставание, с',
+        help_text='Сколько самое старое учтенное изменение ждало обновления'
+    )
+
+    def __str__(self):
+        return f"Снимок статистики от {self.refreshed_at:%d.%m.%Y %H:%M}"
+
+    class Meta:
+        verbose_name = 'Снимок статистики каталога'
+        verbose_name_plural = 'Снимки статистики каталога'
@@ -0,0 +1,98 @@
+"""
+Кэш готовых страниц каталога для анонимных посетителей.
+
+Ключ - путь с параметрами и поколения пространств имен страницы
+(те же области, что у условных GET в catalog/conditional.py): изменение
+продукта или категории меняет поколение, и старая страница просто
+перестает читаться. Попадание не вызывает view и не рендерит шаблон.
+Заголовок X-Cache: HIT, MISS или BYPASS; доля попаданий - семейство
+'pages' в CatalogCache.report().
+"""
+import hashlib
+import time
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cache import CatalogCache
+from .conditional import has_pending_messages
+
+# Семейство ключей в метриках CatalogCache
+FAMILY = 'pages'
+
+
+def _enabled() -> bool:
+    return getattr(settings, 'CATALOG_PAGE_CACHE', True)
+
+
+def _page_key(request, namespaces) -> str:
+    """Ключ страницы: путь с параметрами + поколения ее пространств имен"""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    generations = CatalogCache._generations(CatalogCache.ROOT_NAMESPACE, *namespaces)
+    return f"catalog:page:{path}:g{'.'.join(map(str, generations))}"
+
+
+def _cacheable(request, response) -> bool:
+    """Ответ одинаков для всех анонимных посетителей"""
+    return (
+        request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # Страница с {% csrf_token %} содержит токен конкретного посетителя
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def cached_page(scope: Callable) -> Callable:
+    """
+    Декоратор view: готовый ответ для анонимных запросов без сообщений.
+    scope(request, *args, **kwargs) - пространства имен, от которых зависит страница.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not _enabled()
+                or request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated
+                or has_pending_messages(request)
+            ):
+                response = view(request, *args, **kwargs)
+                response['X-Cache'] = 'BYPASS'
+                return response
+
+            key = _page_key(request, scope(request, *args, **kwargs))
+            payload = cache.get(key)
+            entry = CatalogCache.serializer.loads(payload) if payload is not None else None
+            if entry is not None:
+                status, headers, content = entry
+                CatalogCache._count(FAMILY, 'hit')
+                response = HttpResponse(content, status=status)
+                for name, value in headers:
+                    response[name] = value
+                response['X-Cache'] = 'HIT'
+                return response
+
+            CatalogCache._count(FAMILY, 'miss')
+            started = time.monotonic()
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+
+            if _cacheable(request, response):
+                payload = CatalogCache.serializer.dumps(
+                    (response.status_code, tuple(response.items()), response.content)
+                )
+                cache.set(key, payload, CatalogCache._ttl(FAMILY))
+                CatalogCache._count(FAMILY, 'recomputes')
+                CatalogCache._count(FAMILY, 'recompute_us', int((time.monotonic() - started) * 1_000_000))
+                CatalogCache._count(FAMILY, 'stores')
+                CatalogCache._count(FAMILY, 'bytes', len(payload))
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,233 @@
+"""
+Постраничный вывод по ключу (keyset / seek pagination).
+
+Вместо OFFSET и COUNT(*) следующая страница ищется по значениям
+сортировки последней строки: WHERE (created_at, name, id) "после" курсора.
+С составным индексом по тем же полям каждая страница стоит одинаково,
+независимо от глубины. Курсор - непрозрачный base64-токен.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+
+from .cache import CatalogCache
+from .cache_serializer import from_micros, to_micros
+from .product_index import ProductIndex, get_product_listing
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или от другой сортировки"""
+
+
+class KeysetPage:
+    """Страница keyset-пагинации (совместима с шаблонами по основным атрибутам)"""
+
+    paginator = None
+
+    def __init__(self, object_list: List, has_next: bool, has_previous: bool,
+                 next_cursor: str = None, previous_cursor: str = None, count: int = None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor if has_next else None
+        self.previous_cursor = previous_cursor if has_previous else None
+        # Общее количество берется из кэша статистики, а не из COUNT(*)
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """Пагинатор по ключу сортировки; последнее поле должно быть уникальным"""
+
+    def __init__(self, queryset: QuerySet, per_page: int, ordering: Sequence[str],
+                 loader: Callable[[List[int]], List] = None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.loader = loader
+        model_fields = queryset.model._meta
+        self._types = {
+            name: model_fields.get_field(name).get_internal_type() for name in self.fields
+        }
+
+    # Курсоры
+
+    def encode_cursor(self, values: Sequence, direction: str) -> str:
+        """Значения сортировки -> непрозрачный токен"""
+        payload = [self._dump(name, value) for name, value in zip(self.fields, values)]
+        raw = json.dumps([direction, payload], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str):
+        """Токен -> (направление, значения сортировки)"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, payload = json.loads(raw)
+        except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+            raise InvalidCursor(cursor)
+        if direction not in ('n', 'p') or not isinstance(payload, list) or len(payload) != len(self.fields):
+            raise InvalidCursor(cursor)
+        try:
+            values = [self._load(name, value) for name, value in zip(self.fields, payload)]
+        except (TypeError, ValueError, OverflowError, ArithmeticError):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _dump(self, name, value):
+        """Значение поля -> JSON-совместимое"""
+        if self._types[name] == 'DateTimeField':
+            return to_micros(value)
+        if self._types[name] == 'DecimalField':
+            return str(value)
+        return value
+
+    def _load(self, name, value):
+        if self._types[name] == 'DateTimeField':
+            return from_micros(value)
+        if self._types[name] == 'DecimalField':
+            return Decimal(value)
+        return value
+
+    # Запрос
+
+    def _seek(self, values: Sequence, backwards: bool) -> Q:
+        """Условие "строго после" (или "строго до") значений курсора"""
+        condition = Q()
+        equal = {}
+        for ordered, name, value in zip(self.ordering, self.fields, values):
+            descending = ordered.startswith('-')
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, cursor: Optional[str] = None, count: int = None) -> KeysetPage:
+        """Страница после/до курсора; без курсора или с битым курсором - первая"""
+        direction, values = 'n', None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = 'n', None
+
+        backwards = direction == 'p'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        ordering = self._reversed_ordering() if backwards else self.ordering
+        # Одна лишняя строка показывает, есть ли страница дальше
+        rows = list(queryset.order_by(*ordering).values_list(*self.fields)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        key_index = self.fields.index('id') if 'id' in self.fields else len(self.fields) - 1
+        ids = [row[key_index] for row in rows]
+        if self.loader is not None:
+            object_list = self.loader(ids)
+        else:
+            objects = self.queryset.in_bulk(ids)
+            object_list = [objects[pk] for pk in ids if pk in objects]
+
+        return KeysetPage(
+            object_list,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if rows else None,
+            count=count,
+        )
+
+    def iter_rows(self, cursor: Optional[str] = None, chunk_size: int = 500) -> Iterator[tuple]:
+        """
+        Строки сортировки страницы вперед от курсора потоком: серверный курсор
+        (iterator), в памяти только текущая пачка. Последней идет лишняя строка,
+        если страница не последняя. Битый курсор - InvalidCursor.
+        """
+        queryset = self.queryset
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+            if direction != 'n':
+                raise InvalidCursor(cursor)
+            queryset = queryset.filter(self._seek(values, backwards=False))
+        rows = queryset.order_by(*self.ordering).values_list(*self.fields)[:self.per_page + 1]
+        return rows.iterator(chunk_size=chunk_size)
+
+
+# Порядок списков продуктов: Meta.ordering + id для однозначности
+PRODUCT_ORDERING = ('-created_at', 'name', 'id')
+# Ключи сортировки для отфильтрованных списков (?sort=)
+ORDERINGS = {
+    'new': PRODUCT_ORDERING,
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
+
+
+def paginate_products(request, per_page: int, category_id: int = None,
+                      category_slug: str = None, order: str = None, count: int = None,
+                      queryset: QuerySet = None, loader: Callable = None):
+    """
+    Страница продуктов для списков каталога.
+    Порядок по умолчанию в режиме 'keyset' листается курсором (?cursor=),
+    остальные сортировки и режим 'offset' - обычным Paginator (?page=).
+    Отфильтрованный queryset (фасеты) в режиме 'keyset' листается курсором
+    при любой сортировке.
+    """
+    order = order if order in ProductIndex.ORDERS else ProductIndex.DEFAULT_ORDER
+    mode = getattr(settings, 'CATALOG_PAGINATION', 'keyset')
+    loader = loader or CatalogCache.get_products_info
+
+    if queryset is not None:
+        if mode == 'keyset':
+            paginator = KeysetPaginator(queryset, per_page, ORDERINGS[order], loader=loader)
+            return paginator.get_page(request.GET.get('cursor'), count=count)
+        ids = queryset.order_by(*ORDERINGS[order]).values_list('id', flat=True)
+        page = Paginator(ids, per_page).get_page(request.GET.get('page'))
+        page.object_list = loader(list(page.object_list))
+        return page
+
+    if mode == 'keyset' and order == ProductIndex.DEFAULT_ORDER:
+        queryset = CatalogCache._products_queryset()
+        if category_id:
+            queryset = queryset.filter(category_id=category_id)
+        paginator = KeysetPaginator(
+            queryset, per_page, PRODUCT_ORDERING,
+            loader=CatalogCache.get_products_info,
+        )
+        return paginator.get_page(request.GET.get('cursor'), count=count)
+
+    products = get_product_listing(category_id=category_id, category_slug=category_slug, order=order)
+    return Paginator(products, per_page).get_page(request.GET.get('page'))
@@ -0,0 +1,258 @@
+"""
+Индекс опубликованных продуктов в сортированных множествах Redis.
+
+Для каждого списка (весь каталог и каждая категория) и каждого порядка
+сортировки хранится ZSET "ID продукта -> ключ сортировки". Страница
+читается через ZRANGE/ZCARD за O(размер страницы), а сами продукты -
+пачкой через CatalogCache.get_products_info. При сохранении продукта
+индекс обновляется точечно (ZADD/ZREM), а не перестраивается.
+
+Множества принадлежат версии индекса; готовая версия записана в ключе
+catalog:index:ready. Перестроение (только командой rebuild_product_index)
+строит новую версию рядом со старой и в конце переключает на нее ready,
+поэтому списки все время читают целый индекс. Пока индекса нет,
+списки читаются из CatalogCache.
+"""
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+
+from .cache import CatalogCache
+from .cache_serializer import to_cents, to_micros
+from .models import Product
+
+
+class ProductIndex:
+    """Сортированные множества продуктов для постраничного чтения"""
+
+    # Параметр ?sort= -> (множество, по убыванию)
+    ORDERS = {
+        'new': ('created', True),
+        'price': ('price', False),
+        '-price': ('price', True),
+    }
+    DEFAULT_ORDER = 'new'
+    # Множества и функция вычисления ключа сортировки из строки values_list
+    SCORES = {
+        'created': lambda created_at, price: to_micros(created_at),
+        'price': lambda created_at, price: to_cents(price),
+    }
+    BUILD_BATCH = 5000
+    # Срок жизни отметки о построении (продлевается после каждой пачки)
+    BUILD_LOCK_TTL = 300
+    # Сколько живет прежняя версия после переключения (ее дочитывают текущие запросы)
+    OLD_VERSION_TTL = 60
+
+    @staticmethod
+    def _key(version: str, scope: str, category_id: Optional[int] = None) -> str:
+        """Ключ множества версии индекса (с префиксом кэша)"""
+        return cache.make_key(f"catalog:index:{version}:{scope}:{category_id or 'all'}")
+
+    @staticmethod
+    def _ready_key() -> str:
+        """Версия готового индекса"""
+        return cache.make_key('catalog:index:ready')
+
+    @staticmethod
+    def _building_key() -> str:
+        """Версия, которая сейчас строится"""
+        return cache.make_key('catalog:index:building')
+
+    @staticmethod
+    def _dirty_key(version: str) -> str:
+        """Продукты, измененные во время построения версии"""
+        return cache.make_key(f'catalog:index:{version}:dirty')
+
+    @classmethod
+    def version(cls) -> Optional[str]:
+        """Версия готового индекса; None - индекса нет или кэш не Redis"""
+        connection = CatalogCache._redis()
+        if connection is None:
+            return None
+        version = connection.get(cls._ready_key())
+        return version.decode() if version is not None else None
+
+    @classmethod
+    def available(cls) -> bool:
+        """Индекс построен и Redis доступен (сам индекс здесь не строится)"""
+        return cls.version() is not None
+
+    @classmethod
+    def rebuild(cls) -> Optional[int]:
+        """
+        Построить новую версию индекса по данным БД и переключиться на нее.
+        Возвращает число продуктов; None - индекс уже строит другой процесс.
+        """
+        connection = CatalogCache._redis()
+        if connection is None:
+            return 0
+
+        version = uuid.uuid4().hex[:12]
+        if not connection.set(cls._building_key(), version, nx=True, ex=cls.BUILD_LOCK_TTL):
+            return None
+
+        try:
+            rows = Product.objects.filter(is_published=True).values_list(
+                'id', 'category_id', 'created_at', 'price'
+            ).order_by()
+            count = 0
+            category_ids = set()
+            pipe = connection.pipeline(transaction=False)
+            for pk, category_id, created_at, price in rows.iterator(chunk_size=cls.BUILD_BATCH):
+                cls._add(pipe, version, pk, category_id, created_at, price)
+                category_ids.add(category_id)
+                count += 1
+                if count % cls.BUILD_BATCH == 0:
+                    pipe.expire(cls._building_key(), cls.BUILD_LOCK_TTL)
+                    pipe.execute()
+            pipe.execute()
+
+            # Курсор мог прочитать старые строки продуктов, измененных во время
+            # построения, - перечитываем их (новые изменения sync пишет и сюда)
+            dirty = [int(pk) for pk in connection.smembers(cls._dirty_key(version))]
+            if dirty:
+                cls._apply(connection, [version], {pk: category_ids for pk in dirty})
+
+            old = cls.version()
+            pipe = connection.pipeline()
+            pipe.set(cls._ready_key(), version)
+            pipe.delete(cls._building_key(), cls._dirty_key(version))
+            pipe.execute()
+        except Exception:
+            connection.delete(cls._building_key())
+            cls._expire_version(connection, version, 0)
+            raise
+
+        if old is not None:
+            cls._expire_version(connection, old, cls.OLD_VERSION_TTL)
+        return count
+
+    @classmethod
+    def _expire_version(cls, connection, version: str, ttl: int):
+        """Удалить множества версии (ttl > 0 - через ttl секунд)"""
+        pipe = connection.pipeline(transaction=False)
+        for key in connection.scan_iter(match=cache.make_key(f'catalog:index:{version}:*')):
+            if ttl:
+                pipe.expire(key, ttl)
+            else:
+                pipe.delete(key)
+        pipe.execute()
+
+    @classmethod
+    def _add(cls, pipe, version, pk, category_id, created_at, price):
+        """Добавить продукт во все его множества версии"""
+        for scope, score in cls.SCORES.items():
+            value = score(created_at, price)
+            pipe.zadd(cls._key(version, scope), {pk: value})
+            pipe.zadd(cls._key(version, scope, category_id), {pk: value})
+
+    @classmethod
+    def _apply(cls, connection, versions: List[str], products: Dict[int, Iterable[int]]):
+        """Записать текущее состояние продуктов из БД в множества версий"""
+        current = {
+            row[0]: row for row in Product.objects.filter(
+                pk__in=list(products), is_published=True
+            ).values_list('id', 'category_id', 'created_at', 'price')
+        }
+        pipe = connection.pipeline(transaction=False)
+        for version in versions:
+            for pk, category_ids in products.items():
+                for scope in cls.SCORES:
+                    pipe.zrem(cls._key(version, scope), pk)
+                    for category_id in category_ids:
+                        pipe.zrem(cls._key(version, scope, category_id), pk)
+                if pk in current:
+                    cls._add(pipe, version, *current[pk])
+        pipe.execute()
+
+    @classmethod
+    def sync(cls, products: Dict[int, Iterable[int]]):
+        """
+        Точечно обновить индекс после изменения продуктов: готовую версию
+        и ту, что сейчас строится. products: ID продукта -> категории,
+        в которых он мог состоять.
+        """
+        connection = CatalogCache._redis()
+        if connection is None or not products:
+            return
+
+        ready, building = (
+            value.decode() if value is not None else None
+            for value in connection.mget([cls._ready_key(), cls._building_key()])
+        )
+        versions = [version for version in (ready, building) if version is not None]
+        if not versions:
+            return
+        if building is not None:
+            connection.sadd(cls._dirty_key(building), *products)
+            connection.expire(cls._dirty_key(building), cls.BUILD_LOCK_TTL)
+        cls._apply(connection, versions, products)
+
+    @classmethod
+    def count(cls, version: str, order: str = DEFAULT_ORDER, category_id: Optional[int] = None) -> int:
+        """Количество продуктов в списке (ZCARD)"""
+        scope, _ = cls.ORDERS.get(order, cls.ORDERS[cls.DEFAULT_ORDER])
+        return CatalogCache._redis().zcard(cls._key(version, scope, category_id))
+
+    @classmethod
+    def page(cls, version: str, start: int, stop: int, order: str = DEFAULT_ORDER,
+             category_id: Optional[int] = None) -> List:
+        """Продукты с позиции start по stop (не включая) в нужном порядке"""
+        scope, reverse = cls.ORDERS.get(order, cls.ORDERS[cls.DEFAULT_ORDER])
+        connection = CatalogCache._redis()
+        key = cls._key(version, scope, category_id)
+        if reverse:
+            ids = connection.zrevrange(key, start, stop - 1)
+        else:
+            ids = connection.zrange(key, start, stop - 1)
+        return CatalogCache.get_products_info([int(pk) for pk in ids])
+
+
+class IndexedProductList:
+    """
+    Ленивый список продуктов для Paginator: count() - это ZCARD,
+    а срез - ZRANGE только по нужной странице.
+    """
+
+    def __init__(self, version: str, order: str = ProductIndex.DEFAULT_ORDER,
+                 category_id: Optional[int] = None):
+        # Версия фиксируется на весь запрос: переключение индекса не рвет страницу
+        self.version = version
+        self.order = order
+        self.category_id = category_id
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = ProductIndex.count(self.version, self.order, self.category_id)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start = item.start or 0
+            stop = self.count() if item.stop is None else item.stop
+            return ProductIndex.page(self.version, start, stop, self.order, self.category_id)
+        return ProductIndex.page(self.version, item, item + 1, self.order, self.category_id)[0]
+
+
+def get_product_listing(category_id: Optional[int] = None, category_slug: str = None,
+                        order: str = ProductIndex.DEFAULT_ORDER):
+    """
+    Источник продуктов для постраничного вывода: индекс Redis, если он
+    построен, иначе кэшированный список CatalogCache.
+    """
+    if order not in ProductIndex.ORDERS:
+        order = ProductIndex.DEFAULT_ORDER
+    version = ProductIndex.version()
+    if version is not None:
+        return IndexedProductList(version, order, category_id)
+
+    products = CatalogCache.get_products(category_slug)
+    if order != ProductIndex.DEFAULT_ORDER:
+        _, reverse = ProductIndex.ORDERS[order]
+        products = sorted(products, key=lambda product: product.price, reverse=reverse)
+    return products
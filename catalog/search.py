@@ -0,0 +1,136 @@
+"""
+Поиск продуктов каталога.
+
+Все бэкенды реализуют один интерфейс: search(query, category_id, limit)
+возвращает ID опубликованных продуктов по убыванию релевантности.
+Сами продукты подгружаются пачкой через CatalogCache.get_products_info.
+Бэкенд выбирается настройкой CATALOG_SEARCH_BACKEND.
+Там же подсказки для автодополнения (suggest) по названиям продуктов
+и категорий: в PostgreSQL ILIKE обслуживают триграммные GIN-индексы.
+"""
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Length
+from django.utils.module_loading import import_string
+
+from .models import Category, Product
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда поиска"""
+
+    # Какая СУБД нужна бэкенду (None - любая)
+    vendor = None
+
+    def search(self, query: str, category_id: Optional[int] = None, limit: int = 500) -> List[int]:
+        raise NotImplementedError
+
+    def suggest(self, prefix: str, limit: int = 8) -> Dict[str, List]:
+        """
+        Подсказки по названиям: порядок задается в SQL (_suggest_ordering),
+        из БД читается только limit строк.
+        """
+        ordering = self._suggest_ordering(prefix)
+        products = Product.objects.filter(is_published=True, name__icontains=prefix)
+        categories = Category.objects.filter(name__icontains=prefix)
+        return {
+            'products': list(products.order_by(*ordering).values_list('id', 'name')[:limit]),
+            'categories': list(categories.order_by(*ordering).values_list('slug', 'name')[:limit]),
+        }
+
+    def _suggest_ordering(self, prefix: str) -> list:
+        """Порядок подсказок: сначала начинающиеся с prefix, затем короткие названия"""
+        starts = Case(When(name__istartswith=prefix, then=Value(0)), default=Value(1),
+                      output_field=IntegerField())
+        return [starts, Length('name'), 'name']
+
+    @staticmethod
+    def _published(category_id: Optional[int] = None):
+        qs = Product.objects.filter(is_published=True)
+        if category_id:
+            qs = qs.filter(category_id=category_id)
+        return qs
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL по колонке search_vector.
+    Вектор (название - вес A, описание - вес B, словари russian и english)
+    поддерживает триггер БД, поиск идет по GIN-индексу.
+    """
+
+    vendor = 'postgresql'
+    CONFIGS = ('russian', 'english')
+
+    def search(self, query: str, category_id: Optional[int] = None, limit: int = 500) -> List[int]:
+        search_query = None
+        for config in self.CONFIGS:
+            part = SearchQuery(query, config=config, search_type='websearch')
+            search_query = part if search_query is None else search_query | part
+
+        return list(
+            self._published(category_id)
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-created_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    def _suggest_ordering(self, prefix: str) -> list:
+        """Сначала начинающиеся с prefix, затем по триграммному сходству (pg_trgm)"""
+        starts = super()._suggest_ordering(prefix)[0]
+        return [starts, TrigramSimilarity('name', prefix).desc(), 'name']
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск подстроки средствами ORM (для SQLite и разработки)"""
+
+    def search(self, query: str, category_id: Optional[int] = None, limit: int = 500) -> List[int]:
+        return list(
+            self._published(category_id)
+            .filter(Q(name__icontains=query) | Q(description__icontains=query))
+            # Совпадения в названии выше совпадений в описании
+            .annotate(rank=Case(
+                When(name__icontains=query, then=Value(1)),
+                default=Value(0), output_field=IntegerField(),
+            ))
+            .order_by('-rank', '-created_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+
+
+# Бэкенд для СУБД, которую не поддерживает выбранный (например, SQLite в тестах)
+FALLBACK_BACKEND = 'catalog.search_engine.InMemorySearchBackend'
+
+_backend = None
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """Бэкенд из настроек; если он требует другую СУБД - FALLBACK_BACKEND"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'CATALOG_SEARCH_BACKEND', 'catalog.search.PostgresSearchBackend')
+        backend = import_string(path)()
+        if backend.vendor and backend.vendor != connection.vendor:
+            backend = import_string(FALLBACK_BACKEND)()
+        _backend = backend
+    return _backend
+
+
+def search_product_ids(query: str, category_id: Optional[int] = None) -> List[int]:
+    """ID найденных продуктов, не больше CATALOG_SEARCH_LIMIT"""
+    query = query.strip()
+    if not query:
+        return []
+    limit = getattr(settings, 'CATALOG_SEARCH_LIMIT', 500)
+    return get_search_backend().search(query, category_id=category_id, limit=limit)
+
+
+def normalize_prefix(prefix: str) -> str:
+    """Префикс для автодополнения: нижний регистр, одиночные пробелы, ограничение длины"""
+    max_length = getattr(settings, 'CATALOG_AUTOCOMPLETE', {}).get('MAX_LENGTH', 64)
+    return ' '.join(prefix.lower().split())[:max_length]
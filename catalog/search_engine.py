@@ -0,0 +1,219 @@
+"""
+Поисковый движок в памяти процесса - запасной бэкенд поиска
+для разработки и тестов на SQLite.
+
+Обратный индекс по названию и описанию опубликованных продуктов:
+термин -> (порядковые номера документов, частоты) в компактных array('I').
+Ранжирование BM25, название весит больше описания. Индекс строится
+при первом поиске и обновляется точечно из сигналов save/delete
+(только в своем процессе - для production используйте PostgreSQL).
+"""
+import math
+import re
+import threading
+from array import array
+from heapq import nlargest
+from typing import Dict, Iterable, List, Optional
+
+from .models import Product
+from .search import BaseSearchBackend
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+# Окончания для легкого стемминга (длинные проверяются первыми)
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ими', 'ыми', 'ией',
+    'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ах', 'ях', 'ов', 'ев',
+    'ей', 'ам', 'ям', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+ENGLISH_ENDINGS = ('ing', 'ies', 'es', 'ed', 's')
+MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Отбросить окончание, если остается основа не короче MIN_STEM"""
+    endings = RUSSIAN_ENDINGS if CYRILLIC_RE.search(word) else ENGLISH_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Текст -> основы слов (нижний регистр, ё -> е)"""
+    if not text:
+        return []
+    return [stem(token) for token in TOKEN_RE.findall(text.lower().replace('ё', 'е'))]
+
+
+class SearchEngine:
+    """Обратный индекс с ранжированием BM25"""
+
+    K1 = 1.2
+    B = 0.75
+    # Каждое вхождение в название считается как NAME_WEIGHT вхождений в описание
+    NAME_WEIGHT = 3
+    # Уплотнять постинги, когда мертвых документов больше, чем живых
+    COMPACT_RATIO = 1.0
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self._reset()
+
+    def _reset(self):
+        # Документ - порядковый номер; при изменении продукта он получает новый,
+        # а старый номер становится "мертвым" и пропускается до уплотнения
+        self._postings: Dict[str, tuple] = {}
+        self._doc_ids = array('I')
+        self._doc_lengths = array('I')
+        self._doc_categories = array('I')
+        self._live: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._live)
+
+    def build(self, rows: Iterable):
+        """Построить индекс заново из (id, name, description, category_id)"""
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(*row)
+            self.built = True
+
+    def build_from_db(self, chunk_size: int = 5000):
+        self.build(self._published().iterator(chunk_size=chunk_size))
+
+    @staticmethod
+    def _published(ids=None):
+        qs = Product.objects.filter(is_published=True)
+        if ids is not None:
+            qs = qs.filter(pk__in=ids)
+        return qs.values_list('id', 'name', 'description', 'category_id').order_by()
+
+    def _add(self, product_id, name, description, category_id):
+        frequencies: Dict[str, int] = {}
+        for token in tokenize(name):
+            frequencies[token] = frequencies.get(token, 0) + self.NAME_WEIGHT
+        for token in tokenize(description):
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        ordinal = len(self._doc_ids)
+        length = sum(frequencies.values())
+        self._doc_ids.append(product_id)
+        self._doc_lengths.append(length)
+        self._doc_categories.append(category_id or 0)
+        self._live[product_id] = ordinal
+        self._total_length += length
+
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('I'))
+            postings[0].append(ordinal)
+            postings[1].append(frequency)
+
+    def _remove(self, product_id):
+        ordinal = self._live.pop(product_id, None)
+        if ordinal is not None:
+            self._total_length -= self._doc_lengths[ordinal]
+
+    def update(self, rows: Iterable, removed_ids: Iterable[int] = ()):
+        """Заменить документы продуктов rows и удалить removed_ids"""
+        with self._lock:
+            for product_id in removed_ids:
+                self._remove(product_id)
+            for row in rows:
+                self._remove(row[0])
+                self._add(*row)
+            if len(self._doc_ids) - len(self._live) > len(self._live) * self.COMPACT_RATIO:
+                self._compact()
+
+    def sync(self, product_ids: Iterable[int]):
+        """Перечитать продукты из БД (неопубликованные и удаленные уходят из индекса)"""
+        if not self.built:
+            return
+        product_ids = list(product_ids)
+        self.update(self._published(product_ids), removed_ids=product_ids)
+
+    def _compact(self):
+        """Выбросить мертвые документы и перенумеровать живые"""
+        alive = sorted(self._live.values())
+        renumber = {old: new for new, old in enumerate(alive)}
+        self._doc_ids = array('I', (self._doc_ids[old] for old in alive))
+        self._doc_lengths = array('I', (self._doc_lengths[old] for old in alive))
+        self._doc_categories = array('I', (self._doc_categories[old] for old in alive))
+        self._live = {self._doc_ids[new]: new for new in range(len(alive))}
+
+        postings = {}
+        for term, (ordinals, frequencies) in self._postings.items():
+            kept = [(renumber[o], f) for o, f in zip(ordinals, frequencies) if o in renumber]
+            if kept:
+                postings[term] = (array('I', (o for o, _ in kept)), array('I', (f for _, f in kept)))
+        self._postings = postings
+
+    def search(self, query: str, category_id: Optional[int] = None, limit: int = 500) -> List[int]:
+        """ID продуктов по убыванию BM25 (при равенстве - новые выше)"""
+        terms = set(tokenize(query))
+        with self._lock:
+            documents = len(self._live)
+            if not terms or not documents:
+                return []
+            average_length = self._total_length / documents
+            doc_ids, doc_lengths, live = self._doc_ids, self._doc_lengths, self._live
+            categories = self._doc_categories
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                ordinals, frequencies = postings
+                # Мертвые документы не входят ни в documents, ни в частоту термина
+                matches = [
+                    (ordinal, frequency) for ordinal, frequency in zip(ordinals, frequencies)
+                    if live.get(doc_ids[ordinal]) == ordinal
+                ]
+                frequency_total = len(matches)
+                idf = math.log(1 + (documents - frequency_total + 0.5) / (frequency_total + 0.5))
+                for ordinal, frequency in matches:
+                    if category_id and categories[ordinal] != category_id:
+                        continue
+                    product_id = doc_ids[ordinal]
+                    norm = self.K1 * (1 - self.B + self.B * doc_lengths[ordinal] / average_length)
+                    score = idf * frequency * (self.K1 + 1) / (frequency + norm)
+                    scores[product_id] = scores.get(product_id, 0.0) + score
+
+        best = nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [product_id for product_id, _ in best]
+
+    def stats(self) -> Dict:
+        """Размер индекса"""
+        with self._lock:
+            return {
+                'documents': len(self._live),
+                'dead_documents': len(self._doc_ids) - len(self._live),
+                'terms': len(self._postings),
+                'postings': sum(len(ordinals) for ordinals, _ in self._postings.values()),
+            }
+
+
+# Индекс процесса
+engine = SearchEngine()
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """Бэкенд поиска на SearchEngine; индекс строится при первом запросе"""
+
+    def __init__(self, search_engine: SearchEngine = None):
+        self.engine = search_engine or engine
+
+    def search(self, query: str, category_id: Optional[int] = None, limit: int = 500) -> List[int]:
+        if not self.engine.built:
+            with self.engine._lock:
+                if not self.engine.built:
+                    self.engine.build_from_db()
+        return self.engine.search(query, category_id=category_id, limit=limit)
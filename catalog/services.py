@@ -1,5 +1,7 @@
-from django.db.models import QuerySet, Count, Q
+from django.db.models import QuerySet
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from .cache import ProductRow
 from .models import Product, Category
 
 
@@ -13,22 +15,22 @@ def get_products_by_category(category_slug: str = None) -> QuerySet:
         category = get_object_or_404(Category, slug=category_slug)
         products = products.filter(category=category)
 
-    return products.select_related('category', 'owner')
+    # Только поля карточки: без полной строки владельца и служебных колонок
+    return ProductRow.card_objects(products)
 
 
 def get_categories_with_counts():
     """
     Получить все категории с подсчетом количества продуктов.
+    Количество берется из CategoryStats (JOIN по первичному ключу, без агрегации).
     """
-    from django.db.models import Count, Q
-
     # Фильтруем только категории с slug
     categories = Category.objects.filter(
         slug__isnull=False
     ).exclude(
         slug=''
     ).annotate(
-        products_count=Count('product', filter=Q(product__is_published=True))
+        products_count=Coalesce('stats__published_count', 0)
     ).order_by('name')
 
     return categories
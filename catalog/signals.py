@@ -0,0 +1,231 @@
+"""
+Инвалидация кэша каталога по сигналам моделей.
+
+Затронутые пространства имен копятся в течение транзакции и сбрасываются
+одним конвейером Redis после коммита, поэтому массовые изменения
+(админка, команды, shell) не требуют тысяч обращений к кэшу.
+Там же точечно обновляются индекс продуктов (ProductIndex)
+и поисковый индекс в памяти процесса (search_engine).
+Обновления через QuerySet.update() сигналов не отправляют.
+"""
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+
+from . import category_stats
+from .cache import CatalogCache
+from .models import Product, Category
+from .product_index import ProductIndex
+from .search_engine import engine as search_engine
+
+User = get_user_model()
+
+_pending = threading.local()
+# Поле не загружено (only/defer): исходное значение неизвестно
+DEFERRED = object()
+
+
+def _state():
+    """Накопленные изменения текущего потока"""
+    if not hasattr(_pending, 'namespaces'):
+        _pending.namespaces = set()
+        _pending.category_ids = set()
+        _pending.products = {}
+    return _pending
+
+
+def _flush_pending(using=None) -> bool:
+    """flush уже ждет коммита текущей транзакции"""
+    connection = transaction.get_connection(using)
+    return connection.in_atomic_block and any(entry[1] is flush for entry in connection.run_on_commit)
+
+
+def _schedule(namespaces=(), category_ids=(), using=None, product_id=None):
+    """Запомнить затронутые пространства и сбросить их после коммита"""
+    state = _state()
+    pending = _flush_pending(using)
+    if not pending:
+        # Накопленное без ожидающего flush - изменения откатившейся транзакции
+        # (Django выбросил ее on_commit): сбрасывать их не нужно
+        state.namespaces.clear()
+        state.category_ids.clear()
+        state.products.clear()
+    state.namespaces.update(namespaces)
+    state.category_ids.update(pk for pk in category_ids if pk)
+    if product_id:
+        state.products.setdefault(product_id, set()).update(pk for pk in category_ids if pk)
+    # Вне транзакции on_commit выполняется сразу; повторные вызовы
+    # внутри транзакции ничего не делают - все сбросит первый
+    transaction.on_commit(flush, using=using)
+
+
+def flush():
+    """Сбросить накопленные пространства имен одним конвейером"""
+    state = _state()
+    if not state.namespaces and not state.category_ids and not state.products:
+        return
+
+    namespaces = set(state.namespaces)
+    if state.category_ids:
+        slugs = Category.objects.filter(pk__in=state.category_ids).values_list('slug', flat=True)
+        namespaces.update(f'category:{slug}' for slug in slugs if slug)
+
+    products = dict(state.products)
+    state.namespaces.clear()
+    state.category_ids.clear()
+    state.products.clear()
+    CatalogCache.invalidate_namespaces(*namespaces)
+    ProductIndex.sync(products)
+    search_engine.sync(products)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    """
+    Запоминаем исходную категорию (сбросить и ее страницы) и вклад в CategoryStats.
+    Значения читаются из __dict__: отложенное поле (only/defer) не грузится
+    отдельным запросом на каждую строку
+    """
+    values = instance.__dict__
+    instance._cache_initial_category_id = values.get('category_id', DEFERRED)
+    if all(name in values for name in ('category_id', 'price', 'is_published')):
+        instance._stats_initial = category_stats.contribution(
+            values['category_id'], values['price'], values['is_published']
+        )
+    else:
+        instance._stats_initial = category_stats.UNKNOWN
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+def resolve_product_state(sender, instance, using=None, **kwargs):
+    """Исходная категория была отложена - читаем ее из БД (только при сохранении)"""
+    if instance._state.adding or getattr(instance, '_cache_initial_category_id', None) is not DEFERRED:
+        return
+    category_id = Product.objects.using(using).filter(pk=instance.pk).values_list(
+        'category_id', flat=True
+    ).first()
+    instance._cache_initial_category_id = category_id
+    if 'category_id' not in instance.__dict__:
+        # После удаления строки отложенное поле уже не загрузить
+        instance.category_id = category_id
+
+
+@receiver(pre_delete, sender=Category)
+def resolve_category_state(sender, instance, **kwargs):
+    """Отложенные slug и название загружаем, пока строка категории еще есть"""
+    deferred = [name for name in ('slug', 'name') if name not in instance.__dict__]
+    if deferred:
+        instance.refresh_from_db(fields=deferred)
+
+
+@receiver(post_init, sender=Category)
+def remember_category_state(sender, instance, **kwargs):
+    """Запоминаем исходные slug и название на случай переименования"""
+    instance._cache_initial_slug = instance.__dict__.get('slug', DEFERRED)
+    instance._cache_initial_name = instance.__dict__.get('name', DEFERRED)
+
+
+@receiver(post_init, sender=User)
+def remember_user_state(sender, instance, **kwargs):
+    """Запоминаем исходный email: он хранится в кэшированных карточках продуктов"""
+    instance._cache_initial_email = instance.__dict__.get('email')
+
+
+def _initial(instance, attribute):
+    """Запомненное исходное значение (None - неизвестно)"""
+    value = getattr(instance, attribute, None)
+    return None if value is DEFERRED else value
+
+
+def _product_namespaces(**filters):
+    """Пространства имен продуктов, записи которых в кэше хранят связанные данные"""
+    return [f'product:{pk}' for pk in Product.objects.filter(**filters).values_list('id', flat=True)]
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, using=None, **kwargs):
+    """Продукт создан, изменен, снят с публикации или удален"""
+    # Статистика категорий - сразу, в транзакции сохранения/удаления
+    # (raw-сохранения loaddata пропускаем: после загрузки - rebuild_category_stats)
+    if not kwargs.get('raw'):
+        deleted = kwargs.get('signal') is post_delete
+        new = None if deleted else category_stats.contribution(
+            instance.category_id, instance.price, instance.is_published
+        )
+        old = None if kwargs.get('created') else getattr(instance, '_stats_initial', category_stats.UNKNOWN)
+        category_stats.apply_change(
+            old, new, using=using or 'default',
+            category_ids=(_initial(instance, '_cache_initial_category_id'), instance.category_id),
+        )
+        instance._stats_initial = new
+
+    _schedule(
+        namespaces=('catalog', f'product:{instance.pk}'),
+        category_ids=(instance.category_id, _initial(instance, '_cache_initial_category_id')),
+        using=using,
+        product_id=instance.pk,
+    )
+    instance._cache_initial_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, using=None, **kwargs):
+    """Категория создана, переименована или удалена"""
+    initial_slug = getattr(instance, '_cache_initial_slug', instance.slug)
+    initial_name = getattr(instance, '_cache_initial_name', instance.name)
+    slugs = {instance.slug, _initial(instance, '_cache_initial_slug')}
+    namespaces = ['catalog'] + [f'category:{slug}' for slug in slugs if slug]
+    # Исходное значение отложенного поля неизвестно - считаем, что оно менялось
+    renamed = (
+        initial_slug is DEFERRED or initial_name is DEFERRED
+        or instance.slug != initial_slug or instance.name != initial_name
+    )
+    if renamed and not kwargs.get('created') and not kwargs.get('raw'):
+        # Карточки и детали продуктов хранят название и slug категории
+        namespaces += _product_namespaces(category=instance)
+    _schedule(namespaces=namespaces, using=using)
+    instance._cache_initial_slug = instance.slug
+    instance._cache_initial_name = instance.name
+
+
+@receiver(post_save, sender=User)
+def owner_changed(sender, instance, using=None, **kwargs):
+    """Сменился email владельца - сбрасываем записи его продуктов"""
+    initial = getattr(instance, '_cache_initial_email', instance.email)
+    if initial != instance.email and not kwargs.get('created') and not kwargs.get('raw'):
+        _schedule(namespaces=['catalog'] + _product_namespaces(owner=instance), using=using)
+    instance._cache_initial_email = instance.email
+
+
+@receiver(pre_delete, sender=User)
+def owner_deleted(sender, instance, using=None, **kwargs):
+    """
+    Владелец удален: owner продуктов обнуляется через QuerySet.update()
+    без сигналов, поэтому продукты собираем до удаления
+    """
+    _schedule(namespaces=['catalog'] + _product_namespaces(owner=instance), using=using)
+
+
+def _m2m_changed(sender, instance, action, using=None, **kwargs):
+    """Изменены связи многие-ко-многим продукта или категории"""
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Product):
+        product_changed(Product, instance, using=using)
+    elif isinstance(instance, Category):
+        category_changed(Category, instance, using=using)
+    else:
+        # Изменение со стороны связанной модели - затронут весь каталог
+        _schedule(namespaces=('catalog',), using=using)
+
+
+# Подписываемся на все промежуточные таблицы M2M-полей каталога
+for _model in (Product, Category):
+    for _field in _model._meta.many_to_many:
+        m2m_changed.connect(_m2m_changed, sender=_field.remote_field.through)
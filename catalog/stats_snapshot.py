@@ -0,0 +1,75 @@
+"""
+Материализованная статистика каталога (CatalogStatsSnapshot).
+
+Снимок считается по денормализованной CategoryStats - это O(число
+категорий), а не полный проход по продуктам. Обновление пропускается,
+если с прошлого раза CategoryStats не менялась. "Водяной знак" -
+максимальный updated_at и число строк: удаление категории каскадом
+убирает ее строку, не меняя updated_at остальных.
+"""
+import time
+from decimal import Decimal
+from typing import Tuple
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import CategoryStats, CatalogStatsSnapshot
+
+SNAPSHOT_ID = 1
+TOP_CATEGORIES = 5
+
+
+def get_snapshot():
+    return CatalogStatsSnapshot.objects.filter(pk=SNAPSHOT_ID).first()
+
+
+def refresh(force: bool = False) -> Tuple[CatalogStatsSnapshot, bool]:
+    """
+    Обновить снимок, если есть изменения (или force).
+    Возвращает (снимок, был ли он пересчитан).
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        snapshot = CatalogStatsSnapshot.objects.select_for_update().filter(pk=SNAPSHOT_ID).first()
+        marks = CategoryStats.objects.aggregate(value=Max('updated_at'), rows=Count('pk'))
+        watermark, rows = marks['value'], marks['rows']
+        now = timezone.now()
+
+        if (snapshot is not None and not force
+                and snapshot.watermark == watermark and snapshot.watermark_rows == rows):
+            snapshot.checked_at = now
+            snapshot.save(update_fields=['checked_at'])
+            return snapshot, False
+
+        # Самое старое изменение, которого еще нет в снимке
+        changes = CategoryStats.objects.all()
+        if snapshot is not None and snapshot.watermark is not None:
+            changes = changes.filter(updated_at__gt=snapshot.watermark)
+        oldest_change = changes.aggregate(value=Min('updated_at'))['value']
+
+        totals = CategoryStats.objects.aggregate(
+            total=Sum('published_count'),
+            price_sum=Sum('price_sum'),
+            categories=Count('pk', filter=Q(published_count__gt=0)),
+        )
+        total = totals['total'] or 0
+        top = CategoryStats.objects.filter(published_count__gt=0).order_by(
+            '-published_count', 'category_id'
+        ).values_list('category_id', 'published_count')[:TOP_CATEGORIES]
+
+        snapshot = snapshot or CatalogStatsSnapshot(pk=SNAPSHOT_ID)
+        snapshot.total_products = total
+        snapshot.avg_price = (
+            (Decimal(totals['price_sum']) / total).quantize(Decimal('0.01')) if total else None
+        )
+        snapshot.categories_count = totals['categories']
+        snapshot.top_categories = [list(row) for row in top]
+        snapshot.watermark = watermark
+        snapshot.watermark_rows = rows
+        snapshot.refreshed_at = snapshot.checked_at = now
+        snapshot.staleness_seconds = (now - oldest_change).total_seconds() if oldest_change else 0
+        snapshot.refresh_duration_ms = (time.perf_counter() - started) * 1000
+        snapshot.save()
+    return snapshot, True
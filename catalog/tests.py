@@ -1,3 +1,837 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import category_stats, services, stats_snapshot
+from .cache import CatalogCache, ProductRow
+from .cache_serializer import HEADER, CacheSerializer
+from .facets import FacetFilters, facet_counts
+from .export import CatalogExport
+from .fragments import render_product_cards
+from .middleware import CatalogCacheMemoMiddleware
+from .models import CatalogStatsSnapshot, Category, CategoryStats, Product
+from .pagination import ORDERINGS, PRODUCT_ORDERING, KeysetPaginator
+from .product_index import ProductIndex
+from .search import get_search_backend
+from .search_engine import SearchEngine
+
+User = get_user_model()
+
+
+class CatalogTestCase(TestCase):
+    """Общие данные: категория, владелец и опубликованный продукт"""
+
+    def setUp(self):
+        # Новое общее поколение - кэш предыдущих тестов не читается
+        CatalogCache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner = User.objects.create_user(email='owner@example.com', password='secret')
+            self.category = Category.objects.create(name='Phones')
+            self.product = Product.objects.create(
+                name='Phone X', description='Описание', price=Decimal('100.00'),
+                category=self.category, owner=self.owner,
+            )
+
+
+class InvalidationTests(CatalogTestCase):
+    """Записи продуктов в кэше хранят данные категории и владельца"""
+
+    def test_category_rename_refreshes_product_rows(self):
+        CatalogCache.get_product_info(self.product.pk)
+        CatalogCache.get_products_info([self.product.pk])
+
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = 'Smartphones'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        for row in (
+            CatalogCache.get_product_info(self.product.pk),
+            CatalogCache.get_products_info([self.product.pk])[0],
+        ):
+            self.assertEqual(row.category.name, 'Smartphones')
+            self.assertEqual(row.category.slug, category.slug)
+
+    def test_owner_email_change_refreshes_product_rows(self):
+        CatalogCache.get_product_info(self.product.pk)
+
+        owner = User.objects.get(pk=self.owner.pk)
+        owner.email = 'new@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            owner.save()
+
+        self.assertEqual(CatalogCache.get_product_info(self.product.pk).owner.email, 'new@example.com')
+
+    def test_owner_delete_refreshes_product_rows(self):
+        CatalogCache.get_product_info(self.product.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.owner.pk).delete()
+
+        self.assertIsNone(CatalogCache.get_product_info(self.product.pk).owner_id)
+
+    def test_deferred_loads_do_not_query_per_row(self):
+        for i in range(4):
+            Product.objects.create(name=f'Extra {i}', price=Decimal('1.00'), category=self.category)
+        with self.assertNumQueries(1):
+            list(Product.objects.only('name'))
+        with self.assertNumQueries(1):
+            list(Category.objects.only('description'))
+
+        # Сохранение и удаление отложенных объектов по-прежнему сбрасывают кэш
+        CatalogCache.get_product_info(self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.only('name').get(pk=self.product.pk).delete()
+        self.assertIsNone(CatalogCache.get_product_info(self.product.pk))
+        self.assertEqual(CategoryStats.objects.get(pk=self.category.pk).published_count, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.only('description').get(pk=self.category.pk).delete()
+
+
+class RolledBackChangesTests(TransactionTestCase):
+    """Изменения откатившейся транзакции не сбрасываются со следующим коммитом"""
+
+    def test_rollback_discards_pending_namespaces(self):
+        CatalogCache.clear()
+        category = Category.objects.create(name='Phones')
+        product = Product.objects.create(name='Phone X', price=Decimal('100.00'), category=category)
+        namespace = f'product:{product.pk}'
+        before = CatalogCache._generations(namespace)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            product.price = Decimal('200.00')
+            product.save()
+            raise RuntimeError
+
+        Category.objects.create(name='Tablets')
+        self.assertEqual(CatalogCache._generations(namespace), before)
+
+
+class ProductCardFragmentTests(CatalogTestCase):
+    """Кэш HTML-фрагментов карточек"""
+
+    def render_card(self, user=None):
+        request = RequestFactory().get('/products/')
+        request.user = user or AnonymousUser()
+        return render_product_cards(request, CatalogCache.get_products_info([self.product.pk]))[0]
+
+    def test_category_rename_rerenders_card(self):
+        self.assertIn('Phones', self.render_card())
+
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = 'Smartphones'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        card = self.render_card()
+        self.assertIn('Smartphones', card)
+        self.assertNotIn('>Phones<', card)
+
+    def test_one_fragment_for_all_viewers(self):
+        CatalogCache.reset_metrics()
+        self.assertNotIn('Ваш', self.render_card())
+
+        self.assertIn('Ваш', self.render_card(self.owner))
+
+        counters = CatalogCache.metrics()['card_html']
+        self.assertEqual((counters['miss'], counters['hit'], counters['stores']), (1, 1, 1))
+
+
+class CacheMetricsTests(CatalogTestCase):
+    """Счетчики семейств ключей копятся в процессе и уходят в кэш пачкой"""
+
+    def counter(self, key_name, field):
+        return cache.get(f'{CatalogCache._stats_key(key_name)}:{field}')
+
+    def test_counters_are_flushed_in_batches(self):
+        CatalogCache.reset_metrics()
+        with mock.patch.object(CatalogCache, 'METRICS_FLUSH_INTERVAL', 3600), \
+                mock.patch.object(CatalogCache, '_metrics_flushed', time.monotonic()):
+            CatalogCache.get_product_info(self.product.pk)
+            CatalogCache.get_product_info(self.product.pk)
+            # Интервал не истек - в кэше счетчиков еще нет
+            self.assertIsNone(self.counter('product_detail', 'miss'))
+
+            CatalogCache.flush_metrics()
+            self.assertEqual(self.counter('product_detail', 'miss'), 1)
+            self.assertEqual(self.counter('product_detail', 'hit'), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        counters = CatalogCache.metrics()['product_detail']
+        self.assertEqual((counters['recomputes'], counters['stores'], counters['evictions']), (1, 1, 1))
+        self.assertGreater(counters['bytes'], 0)
+        self.assertEqual(CatalogCache.report()['families']['product_detail']['hit_ratio'], 0.5)
+
+
+class CacheWarmTests(CatalogTestCase):
+    """Прогрев семейства ключей одним set_many"""
+
+    def test_warm_writes_batch_that_reads_hit(self):
+        second = Product.objects.create(name='Phone Y', price=Decimal('200.00'), category=self.category)
+        params = [{'id': self.product.pk}, {'id': second.pk}, {'id': second.pk + 1000}]
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            # Отсутствующий продукт не записывается
+            self.assertEqual(CatalogCache.warm('product_card', params), 2)
+        set_many.assert_called_once()
+
+        with self.assertNumQueries(0):
+            rows = CatalogCache.get_products_info([second.pk, self.product.pk])
+        self.assertEqual([row.name for row in rows], ['Phone Y', 'Phone X'])
+
+
+class ProductsInfoTests(CatalogTestCase):
+    """Пакетное чтение карточек продуктов"""
+
+    def test_order_duplicates_and_negative_cache(self):
+        second = Product.objects.create(name='Phone Y', price=Decimal('200.00'), category=self.category)
+        missing_id = second.pk + 1000
+        ids = [second.pk, missing_id, self.product.pk, second.pk]
+
+        with self.assertNumQueries(1):
+            rows = CatalogCache.get_products_info(ids)
+        # Порядок запроса, без дубликатов и отсутствующих
+        self.assertEqual([row.pk for row in rows], [second.pk, self.product.pk])
+
+        # Отсутствие продукта тоже закэшировано: повторный запрос не идет в БД
+        with self.assertNumQueries(0):
+            rows = CatalogCache.get_products_info([missing_id, self.product.pk])
+        self.assertEqual([row.pk for row in rows], [self.product.pk])
+
+
+class RequestMemoTests(CatalogTestCase):
+    """Мемоизация CatalogCache живет один запрос"""
+
+    def fetches(self, *steps):
+        """Сколько раз get_product_info дошел до кэша; шаг 'rename' меняет продукт"""
+        with mock.patch.object(CatalogCache, '_fetch', wraps=CatalogCache._fetch) as fetch:
+            for step in steps:
+                if step == 'rename':
+                    product = Product.objects.get(pk=self.product.pk)
+                    product.name = 'Phone Z'
+                    with self.captureOnCommitCallbacks(execute=True):
+                        product.save()
+                else:
+                    self.seen.append(CatalogCache.get_product_info(self.product.pk).name)
+            return fetch.call_count
+
+    def test_memo_is_reset_between_requests(self):
+        self.seen, counts = [], []
+        requests = iter([('get', 'get', 'rename', 'get'), ('get', 'get')])
+        middleware = CatalogCacheMemoMiddleware(lambda request: counts.append(self.fetches(*next(requests))))
+        middleware(RequestFactory().get('/'))
+        middleware(RequestFactory().get('/'))
+        # Повтор в запросе - из памяти, инвалидация сбрасывает память,
+        # следующий запрос начинает с пустой памяти
+        self.assertEqual(counts, [2, 1])
+        self.assertEqual(self.seen, ['Phone X', 'Phone X', 'Phone Z', 'Phone Z', 'Phone Z'])
+
+        # Вне запроса мемоизации нет
+        self.assertEqual(self.fetches('get', 'get'), 2)
+
+
+class ProductCardProjectionTests(CatalogTestCase):
+    """Карточки списков читают проекцию, а не полные строки"""
+
+    def test_card_fields_and_truncated_description(self):
+        Product.objects.filter(pk=self.product.pk).update(description='д' * 300)
+        queryset = ProductRow.card_values(Product.objects.filter(pk=self.product.pk))
+        sql = str(queryset.query)
+        for column in ('search_vector', 'password', 'last_login'):
+            self.assertNotIn(column, sql)
+
+        row = ProductRow(ProductRow.pack(queryset.get()))
+        self.assertEqual(len(queryset.get()), len(ProductRow.FIELDS))
+        self.assertEqual(row.description, 'д' * ProductRow.CARD_DESCRIPTION_LENGTH)
+        self.assertEqual((row.category.name, row.owner.email), ('Phones', 'owner@example.com'))
+
+        # Страница продукта по-прежнему получает полное описание
+        self.assertEqual(len(CatalogCache.get_product_info(self.product.pk).description), 300)
+        self.assertEqual(len(CatalogCache.get_products_info([self.product.pk])[0].description), 101)
+
+
+class CatalogExportTests(CatalogTestCase):
+    """Потоковая выгрузка каталога"""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(
+            name='Draft, "quoted"', price=Decimal('5.00'), category=self.category, is_published=False,
+        )
+
+    def test_csv_is_streamed_in_blocks(self):
+        export = CatalogExport('csv')
+        with mock.patch.object(CatalogExport, 'BLOCK_SIZE', 64):
+            blocks = list(export)
+        self.assertGreater(len(blocks), 1)
+        rows = list(csv.reader(io.StringIO(b''.join(blocks).decode())))
+        self.assertEqual(rows[0], list(CatalogExport.COLUMNS))
+        self.assertEqual([row[1] for row in rows[1:]], ['Phone X', 'Draft, "quoted"'])
+        self.assertEqual(export.count, 2)
+
+        published = list(csv.reader(io.StringIO(b''.join(CatalogExport('csv', published_only=True)).decode())))
+        self.assertEqual([row[1] for row in published[1:]], ['Phone X'])
+
+    def test_gzip_jsonl_view(self):
+        self.owner.is_staff = True
+        self.owner.save()
+        self.client.force_login(self.owner)
+
+        response = self.client.get('/export/', {'format': 'jsonl', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('catalog.jsonl.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        products = [json.loads(line) for line in lines]
+        self.assertEqual([product['name'] for product in products], ['Phone X', 'Draft, "quoted"'])
+        self.assertEqual((products[0]['category'], products[0]['owner_email']), ('Phones', 'owner@example.com'))
+
+
+class PageCacheTests(CatalogTestCase):
+    """Кэш готовых страниц для анонимных посетителей"""
+
+    def test_product_page_follows_category_rename(self):
+        url = self.product.get_absolute_url()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = 'Smartphones'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Smartphones')
+
+
+class CategoryPageTests(CatalogTestCase):
+    """Страница категории: сортировка и пагинация"""
+
+    def test_sorted_pages_are_numbered_and_keep_sort(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(12):
+                Product.objects.create(
+                    name=f'Extra {i}', price=Decimal(101 + i), category=self.category, owner=self.owner,
+                )
+        url = f'/category/{self.category.slug}/'
+
+        response = self.client.get(url, {'sort': 'price'})
+        self.assertContains(response, 'href="?sort=price&amp;page=2"')
+        self.assertContains(response, 'href="?sort=-price"')
+
+        response = self.client.get(url, {'sort': 'price', 'page': 2})
+        self.assertContains(response, 'Extra 11')
+        self.assertNotContains(response, 'Phone X')
+
+
+class ConditionalGetTests(CatalogTestCase):
+    """ETag страниц каталога"""
+
+    def test_etag_changes_after_relogin(self):
+        self.client.force_login(self.owner)
+        # Первый ответ выдает CSRF-cookie
+        self.client.get('/products/')
+        etag = self.client.get('/products/')['ETag']
+        self.assertEqual(self.client.get('/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Новый вход - новая сессия и CSRF-токен в форме выхода: старая страница не годится
+        self.client.logout()
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get('/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class FacetCountTests(CatalogTestCase):
+    """Счетчики фасетов"""
+
+    def test_unfiltered_counts_come_from_category_stats(self):
+        request = RequestFactory().get('/products/')
+        request.user = AnonymousUser()
+        filters = FacetFilters.from_request(request)
+
+        # Без фильтров - одно чтение CategoryStats, без GROUP BY по продуктам
+        with self.assertNumQueries(1):
+            counts = facet_counts(filters)
+        self.assertEqual(counts['category'], {self.category.slug: 1})
+        self.assertEqual(counts['total'], 1)
+
+    def test_unfiltered_counts_match_grouped_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Draft', price=Decimal('700.00'), category=self.category,
+                                   owner=self.owner, is_published=False)
+        request = RequestFactory().get('/products/')
+        request.user = self.owner
+        filters = FacetFilters.from_request(request)
+        unfiltered = facet_counts(filters)
+
+        # Те же значения, что дает GROUP BY (фильтр, который ничего не меняет)
+        filters.categories = (self.category.slug,)
+        grouped = facet_counts(filters)
+        self.assertEqual(unfiltered['category'], grouped['category'])
+        self.assertEqual(unfiltered['published'], grouped['published'])
+        self.assertEqual(unfiltered['owner'], grouped['owner'])
+        self.assertEqual(unfiltered['total'], grouped['total'])
+
+
+class ProductIndexTests(CatalogTestCase):
+    """Индекс продуктов в Redis (только при кэше на Redis)"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = CatalogCache._redis()
+        if self.redis is None:
+            self.skipTest('кэш работает не на Redis')
+        self.redis.delete(ProductIndex._ready_key(), ProductIndex._building_key())
+
+    def test_index_is_not_built_by_requests(self):
+        self.client.get('/products/?sort=price&mode=offset')
+        self.assertFalse(ProductIndex.available())
+
+    def test_changes_during_rebuild_are_kept(self):
+        ProductIndex.rebuild()
+        old = ProductIndex.version()
+
+        # Построение идет: изменение пишется и в готовую, и в новую версию
+        self.redis.set(ProductIndex._building_key(), 'next')
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('5.00'))
+        ProductIndex.sync({self.product.pk: {self.category.pk}})
+        for version in (old, 'next'):
+            self.assertEqual(self.redis.zscore(ProductIndex._key(version, 'price'), self.product.pk), 500)
+        self.redis.delete(ProductIndex._building_key())
+        ProductIndex._expire_version(self.redis, 'next', 0)
+
+        self.assertEqual(ProductIndex.rebuild(), 1)
+        self.assertNotEqual(ProductIndex.version(), old)
+        self.assertEqual(
+            self.redis.zscore(ProductIndex._key(ProductIndex.version(), 'price'), self.product.pk), 500,
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация: страницы без пропусков и повторов при одинаковых ключах"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Keyset')
+        Product.objects.bulk_create(
+            Product(name=f'Продукт {i % 3}', price=Decimal(i % 4), category=category)
+            for i in range(23)
+        )
+        # Одинаковое время создания: порядок решают name и id
+        Product.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+    def walk(self, ordering, per_page=5):
+        paginator = KeysetPaginator(Product.objects.all(), per_page, ordering)
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append([product.pk for product in page])
+            if not page.has_next():
+                return paginator, pages, page
+            cursor = page.next_cursor
+
+    def test_forward_pages_cover_ordering(self):
+        for ordering in (PRODUCT_ORDERING, ORDERINGS['price'], ORDERINGS['-price']):
+            expected = list(Product.objects.order_by(*ordering).values_list('id', flat=True))
+            _, pages, _ = self.walk(ordering)
+            self.assertEqual([pk for page in pages for pk in page], expected)
+
+    def test_backward_pages_match_forward(self):
+        paginator, pages, page = self.walk(PRODUCT_ORDERING)
+        backward = [[product.pk for product in page]]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward.append([product.pk for product in page])
+        self.assertEqual(backward[::-1], pages)
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 5, PRODUCT_ORDERING)
+        first = [product.pk for product in paginator.get_page()]
+        self.assertEqual([product.pk for product in paginator.get_page('garbage!')], first)
+
+
+class CategoryStatsTests(CatalogTestCase):
+    """Инкрементальная статистика категорий совпадает с пересчетом"""
+
+    def assertStatsMatch(self):
+        expected = {
+            row['category_id']: row for row in Product.objects.filter(is_published=True)
+            .values('category_id').annotate(
+                published_count=Count('id'), price_sum=Sum('price'),
+                min_price=Min('price'), max_price=Max('price'),
+            )
+        }
+        for stats in CategoryStats.objects.all():
+            row = expected.get(stats.category_id)
+            if row is None:
+                self.assertEqual(stats.published_count, 0)
+                continue
+            self.assertEqual(
+                (stats.published_count, stats.price_sum, stats.min_price, stats.max_price),
+                (row['published_count'], row['price_sum'], row['min_price'], row['max_price']),
+            )
+        self.assertEqual(
+            set(expected),
+            set(CategoryStats.objects.filter(published_count__gt=0).values_list('category_id', flat=True)),
+        )
+
+    def test_incremental_updates(self):
+        other = Category.objects.create(name='Tablets')
+        cheap = Product.objects.create(name='Cheap', price=Decimal('10.00'), category=self.category)
+        self.assertStatsMatch()
+
+        # Уходит минимальная цена - min пересчитывается
+        cheap.price = Decimal('150.00')
+        cheap.save()
+        self.assertStatsMatch()
+
+        cheap.is_published = False
+        cheap.save()
+        self.assertStatsMatch()
+
+        self.product.category = other
+        self.product.save()
+        self.assertStatsMatch()
+
+        # Отложенные поля: исходный вклад неизвестен, категория пересчитывается
+        deferred = Product.objects.only('name').get(pk=self.product.pk)
+        deferred.price = Decimal('1.00')
+        deferred.save()
+        self.assertStatsMatch()
+
+        Product.objects.get(pk=self.product.pk).delete()
+        self.assertStatsMatch()
+
+    def test_deferred_move_rebuilds_both_categories(self):
+        other = Category.objects.create(name='Tablets')
+        product = Product.objects.only('name').get(pk=self.product.pk)
+        product.category = other
+        product.save()
+
+        self.assertStatsMatch()
+        self.assertEqual(CategoryStats.objects.get(pk=self.category.pk).published_count, 0)
+        self.assertEqual(CategoryStats.objects.get(pk=other.pk).published_count, 1)
+
+
+class StatsSnapshotTests(CatalogTestCase):
+    """Снимок статистики каталога"""
+
+    def test_unchanged_stats_are_not_recomputed(self):
+        stats_snapshot.refresh()
+        snapshot, refreshed = stats_snapshot.refresh()
+        self.assertFalse(refreshed)
+        self.assertEqual(snapshot.total_products, 1)
+
+    def test_category_delete_is_detected(self):
+        tablets = Category.objects.create(name='Tablets')
+        Product.objects.create(name='Tablet', price=Decimal('50.00'), category=tablets, owner=self.owner)
+        # Последнее изменение - в другой категории
+        self.product.price = Decimal('120.00')
+        self.product.save()
+        snapshot, _ = stats_snapshot.refresh()
+        self.assertEqual(snapshot.total_products, 2)
+
+        # Каскад удаляет строку статистики; updated_at остальных строк прежний
+        tablets.delete()
+        snapshot, refreshed = stats_snapshot.refresh()
+        self.assertTrue(refreshed)
+        self.assertEqual((snapshot.total_products, snapshot.categories_count), (1, 1))
+
+    def test_stale_snapshot_is_refreshed_by_one_worker(self):
+        stats_snapshot.refresh()
+        CatalogStatsSnapshot.objects.update(checked_at=timezone.now() - timedelta(days=1))
+        lock_key = 'catalog:stats:refresh:lock'
+        self.assertTrue(CatalogCache._acquire(lock_key, 'other-worker'))
+        try:
+            with mock.patch.object(stats_snapshot, 'refresh', wraps=stats_snapshot.refresh) as refresh:
+                self.assertEqual(CatalogCache._compute_stats()['overall']['total'], 1)
+                refresh.assert_not_called()
+        finally:
+            CatalogCache._release(lock_key, 'other-worker')
+
+        with mock.patch.object(stats_snapshot, 'refresh', wraps=stats_snapshot.refresh) as refresh:
+            CatalogCache._compute_stats()
+            refresh.assert_called_once()
+
+
+class IndexPlanTests(TestCase):
+    """
+    Запросы публичного каталога читают продукты по индексу (EXPLAIN).
+    Синтетический каталог с долей опубликованных, как на витрине.
+    """
+    PRODUCTS = 20_000
+    CATEGORIES = 20
+    PUBLISHED_RATIO = 0.3
+
+    # Полный просмотр таблицы продуктов в плане: PostgreSQL и SQLite
+    SEQ_SCAN_PATTERNS = (
+        re.compile(r'Seq Scan on catalog_product\b'),
+        re.compile(r'\bSCAN catalog_product\b(?! USING)'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        categories = Category.objects.bulk_create(
+            Category(name=f'Индексы {i}', slug=f'index-check-{i}') for i in range(cls.CATEGORIES)
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f'Продукт {i}', description='Описание синтетического продукта',
+                    category=rng.choice(categories), is_published=rng.random() < cls.PUBLISHED_RATIO,
+                    price=Decimal(rng.randint(1, 100_000)) / 100,
+                )
+                for i in range(cls.PRODUCTS)
+            ),
+            batch_size=5000,
+        )
+        # bulk_create не вызывает сигналы - пересчитываем статистику категорий
+        category_stats.rebuild(category_ids=[category.pk for category in categories])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def queries(self, slug):
+        """Запросы services.py и CatalogCache в том виде, в каком их выполняют страницы"""
+        category = Category.objects.get(slug=slug)
+        published = Product.objects.filter(is_published=True)
+        in_category = published.filter(category=category)
+        ids = list(in_category.values_list('id', flat=True)[:12])
+        # Списки страниц проверяются на первых 12 строках (+1 строка у курсора)
+        return [
+            ('services.get_products_by_category()',
+             services.get_products_by_category()[:12]),
+            ('services.get_products_by_category(slug)',
+             services.get_products_by_category(slug)[:12]),
+            ('services.get_category_info(slug)',
+             services.get_category_info(slug)['products'][:12]),
+            ('CatalogCache products_all',
+             ProductRow.card_values(CatalogCache._products_queryset())),
+            ('CatalogCache products_category',
+             ProductRow.card_values(CatalogCache._products_queryset(slug))),
+            ('CatalogCache category_detail (recent)',
+             ProductRow.card_values(in_category)[:5]),
+            ('CatalogCache product_card',
+             ProductRow.card_values(published.filter(id__in=ids))),
+            ('keyset: все продукты, новые',
+             published.order_by(*PRODUCT_ORDERING).values_list('created_at', 'name', 'id')[:13]),
+            ('keyset: категория, новые',
+             in_category.order_by(*PRODUCT_ORDERING).values_list('created_at', 'name', 'id')[:13]),
+            ('keyset: категория, по цене',
+             in_category.order_by(*ORDERINGS['price']).values_list('price', 'id')[:13]),
+            ('keyset: категория, по убыванию цены',
+             in_category.order_by(*ORDERINGS['-price']).values_list('price', 'id')[:13]),
+        ]
+
+    def test_catalog_queries_use_indexes(self):
+        slug = Category.objects.filter(stats__published_count__gt=0).values_list('slug', flat=True).first()
+        for name, queryset in self.queries(slug):
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertFalse(
+                    any(pattern.search(plan) for pattern in self.SEQ_SCAN_PATTERNS),
+                    f'Полный просмотр catalog_product:\n{plan}',
+                )
+
+
+class SuggestTests(TestCase):
+    """Подсказки автодополнения"""
+
+    def test_prefix_matches_come_first(self):
+        category = Category.objects.create(name='Audio')
+        Product.objects.bulk_create(
+            [Product(name=f'Big phone case {i}', price=Decimal(1), category=category) for i in range(10)]
+            + [Product(name='Phone stand', price=Decimal(1), category=category)]
+        )
+
+        suggestions = get_search_backend().suggest('phone', limit=3)
+        self.assertEqual(suggestions['products'][0][1], 'Phone stand')
+        self.assertEqual(len(suggestions['products']), 3)
+
+    def test_short_prefix_is_ignored(self):
+        response = self.client.get('/search/autocomplete/', {'q': 'ph'})
+        self.assertEqual(response.json()['products'], [])
+
+
+class ApiTests(CatalogTestCase):
+    """JSON API каталога"""
+
+    def test_products_stream(self):
+        response = self.client.get('/api/products/', {'category': self.category.slug})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['id'] for item in data['results']], [self.product.pk])
+        self.assertIsNone(data['next'])
+
+    def test_unknown_category_is_json_404(self):
+        response = self.client.get('/api/products/', {'category': 'missing'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'category: категория не найдена'})
+
+
+class SearchEngineTests(TestCase):
+    """Поисковый индекс BM25 в памяти"""
+
+    def test_dead_documents_do_not_change_ranking(self):
+        rows = [(1, 'red', '', 1), (2, 'blue', '', 1), (3, 'green', '', 1)]
+        fresh = SearchEngine()
+        fresh.build(rows)
+
+        updated = SearchEngine()
+        updated.COMPACT_RATIO = 100
+        updated.build(rows)
+        # Каждое изменение оставляет мертвый документ с теми же терминами
+        for _ in range(5):
+            updated.update([(2, 'blue', '', 1)])
+        self.assertEqual(updated.stats()['dead_documents'], 5)
+
+        # Частота "blue" считается по живым документам: те же результаты, что у нового индекса
+        self.assertEqual(updated.search('red blue'), fresh.search('red blue'))
+        self.assertEqual(updated.search('red blue'), [2, 1])
+
+
+class CacheSerializerTests(TestCase):
+    """Записи кэша чужого формата и поврежденные - промахи, а не ошибки"""
+
+    def test_round_trip_with_compression(self):
+        serializer = CacheSerializer(schema='test', compress_threshold=16)
+        value = {'rows': [(1, 'a' * 100, None)], 'total': 1}
+        self.assertEqual(serializer.loads(serializer.dumps(value)), value)
+
+    def test_corrupt_data_is_a_miss(self):
+        serializer = CacheSerializer(schema='test', compress_threshold=16)
+        payload = serializer.dumps(list(range(100)))
+        plain = CacheSerializer(schema='test', compress_threshold=0).dumps(list(range(100)))
+        for broken in (payload[:-5], payload[:HEADER.size] + b'garbage', plain[:-3], b'\x01'):
+            self.assertIsNone(serializer.loads(broken))
+
+    def test_other_python_version_is_a_miss(self):
+        serializer = CacheSerializer(schema='test')
+        with mock.patch.object(sys, 'version_info', (2, 7, 18)):
+            old = CacheSerializer(schema='test')
+        self.assertNotEqual(old.schema, serializer.schema)
+        self.assertIsNone(serializer.loads(old.dumps([1, 2, 3])))
+
+
+class LocalCacheTests(TestCase):
+    """Процессный кэш L1 и его инвалидация через pub/sub"""
+
+    class StopListening(BaseException):
+        """Остановить бесконечный цикл _listen (Exception он перехватывает)"""
+
+    def setUp(self):
+        for name, value in (('L1_SETTINGS', {'MAX_SIZE': 16, 'TTL': 60, 'KEYS': ['category_detail']}),
+                            ('_l1', None), ('_l1_generations', None), ('_listener_pid', None)):
+            patcher = mock.patch.object(CatalogCache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        CatalogCache.clear()
+
+    def connection(self, *messages):
+        """Соединение Redis, подписка которого получает messages и обрывается"""
+        def listen():
+            for data in messages:
+                yield {'type': 'message', 'data': data}
+            raise self.StopListening
+        connection = mock.Mock()
+        connection.pubsub.return_value.listen.side_effect = listen
+        return connection
+
+    def test_invalidation_message_drops_l1_generation(self):
+        changed, other = 'category:l1-changed', 'category:l1-other'
+        keys = [CatalogCache._generation_key(namespace) for namespace in (changed, other)]
+        cache.delete_many(keys)
+        CatalogCache._local()
+        self.assertEqual(CatalogCache._generations(changed, other), [0, 0])
+        # Другой процесс сменил поколения в Redis; L1 этого процесса их еще помнит
+        cache.set_many(dict(zip(keys, (5, 7))))
+        self.assertEqual(CatalogCache._generations(changed, other), [0, 0])
+
+        with self.assertRaises(self.StopListening):
+            CatalogCache._listen(self.connection(changed.encode()))
+        self.assertEqual(CatalogCache._generations(changed, other), [5, 0])
+
+    def test_concurrent_first_use_creates_one_l1(self):
+        init_local = CatalogCache._init_local.__func__
+
+        def slow_init(cls):
+            time.sleep(0.05)
+            init_local(cls)
+
+        barrier = threading.Barrier(8)
+
+        def first_use():
+            barrier.wait()
+            CatalogCache._local()
+
+        with mock.patch.object(CatalogCache, '_init_local', classmethod(slow_init)):
+            with mock.patch.object(CatalogCache, '_init_local', wraps=CatalogCache._init_local) as init:
+                threads = [threading.Thread(target=first_use) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(init.call_count, 1)
+
+
+class SingleFlightTests(TestCase):
+    """Пересчет значения под блокировкой и отдача устаревшего значения"""
+
+    key = 'test:single-flight'
+
+    def setUp(self):
+        cache.delete_many([self.key, f'{self.key}:lock'])
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return ['fresh']
+
+    def store_expired(self, value):
+        entry = (value, time.time() - 1, 0.01)
+        cache.set(self.key, CatalogCache.serializer.dumps(entry), 60)
+
+    def test_expired_value_is_recomputed_once(self):
+        self.store_expired(['old'])
+        self.assertEqual(CatalogCache._fetch('products_all', self.key, self.compute), ['fresh'])
+        self.assertEqual(CatalogCache._fetch('products_all', self.key, self.compute), ['fresh'])
+        self.assertEqual(self.calls, 1)
+        # Блокировка снята после пересчета
+        self.assertTrue(CatalogCache._acquire(f'{self.key}:lock', 'next'))
+
+    def test_stale_value_while_another_worker_refreshes(self):
+        self.store_expired(['old'])
+        self.assertTrue(CatalogCache._acquire(f'{self.key}:lock', 'other-worker'))
+        self.assertEqual(CatalogCache._fetch('products_all', self.key, self.compute), ['old'])
+        self.assertEqual(self.calls, 0)
+
+    def test_miss_waits_for_lock_holder_then_computes(self):
+        self.assertTrue(CatalogCache._acquire(f'{self.key}:lock', 'other-worker'))
+        with mock.patch.object(CatalogCache, 'LOCK_WAIT', 0.1):
+            self.assertEqual(CatalogCache._fetch('products_all', self.key, self.compute), ['fresh'])
+        self.assertEqual(self.calls, 1)
+
+    def test_release_keeps_foreign_lock(self):
+        lock_key = f'{self.key}:lock'
+        self.assertTrue(CatalogCache._acquire(lock_key, 'mine'))
+        # Наша блокировка истекла, ее взял другой воркер
+        cache.delete(lock_key)
+        self.assertTrue(CatalogCache._acquire(lock_key, 'theirs'))
+        CatalogCache._release(lock_key, 'mine')
+        self.assertFalse(CatalogCache._acquire(lock_key, 'third'))
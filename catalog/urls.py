@@ -6,6 +6,7 @@ from .views import (
     ProductCreateView, ProductUpdateView, ProductDeleteView,
     toggle_publish_status,
 )
+from . import api
 from . import views as catalog_views
 
 app_name = 'catalog'
@@ -34,8 +35,19 @@ urlpatterns = [
 
     # Поиск и статистика (функциональные)
     path('search/', catalog_views.search_products, name='search_products'),
+    path('search/autocomplete/', catalog_views.autocomplete, name='autocomplete'),
     path('statistics/', catalog_views.statistics_view, name='statistics'),
 
+    # Состояние кэша каталога (JSON, только для персонала)
+    path('cache/debug/', catalog_views.cache_debug, name='cache_debug'),
+    # Выгрузка каталога CSV/JSONL (только для персонала)
+    path('export/', catalog_views.export_catalog, name='export_catalog'),
+
+    # JSON API только для чтения
+    path('api/products/', api.products, name='api_products'),
+    path('api/products/<int:pk>/', api.product, name='api_product'),
+    path('api/categories/', api.categories, name='api_categories'),
+
     # Управление публикацией
     path('product/<int:pk>/toggle-publish/', toggle_publish_status,
          name='product_toggle_publish'),
@@ -1,19 +1,31 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
 
 from catalog.models import Product, Category
 from catalog.forms import ProductForm  # Убрал CategoryForm, если его нет
 from catalog.cache import CatalogCache  # Импортируем класс, а не cache_manager
+from catalog.conditional import catalog_scope, category_scope, conditional_page, product_scope
+from catalog.page_cache import cached_page
+from catalog.fragments import render_product_cards
+from catalog.export import CatalogExport
+from catalog.facets import FacetFilters, build_facets, facet_counts, filter_queryset, load_products
+from catalog.pagination import paginate_products
+from catalog.search import normalize_prefix, search_product_ids
 
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
 
 # Сохраняем существующие CBV для обратной совместимости
+@method_decorator([conditional_page(catalog_scope), cached_page(catalog_scope)], name='get')
 class HomeListView(ListView):
     """Главная страница (CBV версия)"""
     model = Product
@@ -30,17 +42,32 @@ class HomeListView(ListView):
         return context
 
 
+@method_decorator([conditional_page(catalog_scope), cached_page(catalog_scope)], name='get')
 class ProductListView(ListView):
     """Список продуктов (CBV версия)"""
     model = Product
-    template_name = 'catalog/product_list_cbv.html'
+    template_name = 'catalog/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
 
     def get_queryset(self):
-        return cache_manager.get_products()
+        # Ленивый QuerySet: сама страница выбирается в paginate_queryset
+        return Product.objects.filter(is_published=True)
 
+    def paginate_queryset(self, queryset, page_size):
+        # Страница с фасетами: курсор (?cursor=) или индекс Redis вместо OFFSET + COUNT(*)
+        self.listing = _product_listing(self.request, page_size)
+        page = self.listing['page_obj']
+        return page.paginator, page, page.object_list, page.has_other_pages()
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.listing)
+        context['title'] = 'Все продукты'
+        return context
+
+
+@method_decorator([conditional_page(product_scope), cached_page(product_scope)], name='get')
 class ProductDetailView(DetailView):
     """Детальная страница продукта (CBV версия)"""
     model = Product
@@ -65,8 +92,6 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.owner = self.request.user
         response = super().form_valid(form)
-        # Инвалидируем кэш
-        cache_manager.invalidate_product(self.object.id)
         messages.success(self.request, f'✅ Продукт "{self.object.name}" создан!')
         return response
 
@@ -83,8 +108,6 @@ class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        # Инвалидируем кэш
-        cache_manager.invalidate_product(self.object.id)
         messages.success(self.request, f'✅ Продукт "{self.object.name}" обновлен!')
         return response
 
@@ -101,8 +124,6 @@ class ProductDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
     def delete(self, request, *args, **kwargs):
         product = self.get_object()
-        # Инвалидируем кэш перед удалением
-        cache_manager.invalidate_product(product.id)
         messages.success(request, f'✅ Продукт "{product.name}" удален!')
         return super().delete(request, *args, **kwargs)
 
@@ -131,42 +152,70 @@ def index(request):
     """Главная страница"""
     context = {
         'title': 'Главная страница',
-        'featured_products': cache_manager.get_products()[:8] if cache_manager.get_products() else [],
+        'featured_products': cache_manager.get_products()[:8],
         'categories': cache_manager.get_categories(),
         'stats': cache_manager.get_stats(),
     }
     return render(request, 'catalog/index.html', context)
 
 
-def product_list(request):
-    """Список всех продуктов"""
-    products = cache_manager.get_products()
+def _product_list_query(sort, filters):
+    """Параметры URL для ссылок пагинации (с завершающим &)"""
+    query = '&'.join(part for part in (f'sort={sort}' if sort else '', filters.query_string()) if part)
+    return query + '&' if query else ''
 
-    # Пагинация
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    context = {
-        'title': 'Все продукты',
+def _product_listing(request, per_page=12):
+    """Страница продуктов с фасетами для списков каталога"""
+    sort = request.GET.get('sort', '')
+    filters = FacetFilters.from_request(request)
+    counts = facet_counts(filters)
+
+    # Пагинация: курсор (?cursor=) или индекс Redis вместо OFFSET + COUNT(*)
+    if filters.active:
+        page_obj = paginate_products(
+            request, per_page, order=sort, count=counts['total'],
+            queryset=filter_queryset(filters), loader=load_products,
+        )
+    else:
+        page_obj = paginate_products(request, per_page, order=sort, count=counts['total'])
+
+    return {
         'products': page_obj,
         'page_obj': page_obj,
+        # Карточки - HTML-фрагменты из кэша (один get_many на страницу)
+        'product_cards': render_product_cards(request, page_obj.object_list),
+        'sort': sort,
+        'facets': build_facets(filters, counts, base_query=f'sort={sort}' if sort else ''),
+        'page_query': _product_list_query(sort, filters),
     }
+
+
+@conditional_page(catalog_scope)
+@cached_page(catalog_scope)
+def product_list(request):
+    """Список всех продуктов"""
+    context = _product_listing(request)
+    context['title'] = 'Все продукты'
     return render(request, 'catalog/product_list.html', context)
 
 
+@conditional_page(category_scope)
+@cached_page(category_scope)
 def category_products(request, slug):
     """Продукты по категории"""
-    # Получаем продукты через кэш
-    products = cache_manager.get_products(slug)
-
     # Получаем информацию о категории через кэш
     category_info = cache_manager.get_category_info(slug)
-
-    # Пагинация
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sort = request.GET.get('sort', '')
+
+    # Пагинация: курсор (?cursor=) или индекс Redis вместо OFFSET + COUNT(*)
+    if category_info:
+        page_obj = paginate_products(
+            request, 12, category_id=category_info['category'].id, category_slug=slug,
+            order=sort, count=category_info['stats']['count'],
+        )
+    else:
+        page_obj = Paginator([], 12).get_page(1)
 
     category_name = category_info['category'].name if category_info and 'category' in category_info else slug
 
@@ -176,10 +225,15 @@ def category_products(request, slug):
         'page_obj': page_obj,
         'category': category_info['category'] if category_info else None,
         'category_stats': category_info.get('stats') if category_info else None,
+        'sort': sort,
+        # Ссылки пагинации сохраняют сортировку
+        'page_query': urlencode({'sort': sort}) + '&' if sort else '',
     }
     return render(request, 'catalog/category_products.html', context)
 
 
+@conditional_page(product_scope)
+@cached_page(product_scope)
 def product_detail(request, pk):
     """Детальная информация о продукте"""
     # Сначала пытаемся получить из кэша
@@ -217,9 +271,6 @@ def product_create(request):
 
             messages.success(request, f'✅ Продукт "{product.name}" успешно создан!')
 
-            # Инвалидируем кэш
-            cache_manager.invalidate_product(product.id)
-
             return redirect('catalog:product_detail', pk=product.pk)
     else:
         form = ProductForm()
@@ -248,9 +299,6 @@ def product_update(request, pk):
 
             messages.success(request, f'✅ Продукт "{product.name}" успешно обновлен!')
 
-            # Инвалидируем кэш
-            cache_manager.invalidate_product(product.id)
-
             return redirect('catalog:product_detail', pk=product.pk)
     else:
         form = ProductForm(instance=product)
@@ -276,9 +324,6 @@ def product_delete(request, pk):
     if request.method == 'POST':
         product_name = product.name
 
-        # Инвалидируем кэш перед удалением
-        cache_manager.invalidate_product(product.id)
-
         product.delete()
 
         messages.success(request, f'✅ Продукт "{product_name}" успешно удален!')
@@ -302,9 +347,6 @@ def toggle_publish_status(request, pk):
     status = "опубликован" if product.is_published else "снят с публикации"
     messages.success(request, f'✅ Продукт "{product.name}" {status}!')
 
-    # Инвалидируем кэш через cache_manager
-    cache_manager.invalidate_product(product.id)
-
     return redirect('catalog:product_detail', pk=product.pk)
 
 
@@ -335,9 +377,6 @@ def category_create(request):
 
             messages.success(request, f'✅ Категория "{category.name}" создана!')
 
-            # Инвалидируем кэш
-            cache_manager.invalidate_category()
-
             # Проверяем есть ли slug перед редиректом
             if category.slug:
                 return redirect('catalog:category_products', slug=category.slug)
@@ -366,18 +405,12 @@ def category_update(request, slug):
     category = get_object_or_404(Category, slug=slug)
 
     if request.method == 'POST':
-        old_slug = category.slug
-
         category.name = request.POST.get('name', category.name)
         category.description = request.POST.get('description', category.description)
         category.save()
 
         messages.success(request, f'✅ Категория "{category.name}" успешно обновлена!')
 
-        # Инвалидируем кэш для старого и нового slug
-        cache_manager.invalidate_category(old_slug)
-        cache_manager.invalidate_category(category.slug)
-
         return redirect('catalog:category_products', slug=category.slug)
 
     context = {
@@ -395,9 +428,6 @@ def category_delete(request, slug):
     if request.method == 'POST':
         category_name = category.name
 
-        # Инвалидируем кэш перед удалением
-        cache_manager.invalidate_category(category.slug)
-
         category.delete()
 
         messages.success(request, f'✅ Категория "{category_name}" успешно удалена!')
@@ -425,37 +455,68 @@ def categories_list(request):
 
 def search_products(request):
     """Поиск продуктов"""
-    query = request.GET.get('q', '')
-    category_slug = request.GET.get('category', '')
-
-    if query or category_slug:
-        # Получаем базовый QuerySet из кэша
-        if category_slug:
-            products = list(cache_manager.get_products(category_slug))
-        else:
-            products = list(cache_manager.get_products())
+    query = request.GET.get('q', '').strip()
+    filters = FacetFilters.from_request(request)
 
-        # Применяем поиск по названию
+    if query or filters.active:
         if query:
-            products = [p for p in products if query.lower() in p.name.lower()]
-
-        # Пагинация
-        paginator = Paginator(products, 12)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+            # Ранжированный поиск (бэкенд из CATALOG_SEARCH_BACKEND), затем фасеты
+            product_ids = search_product_ids(query)
+            counts = facet_counts(filters, product_ids=product_ids, cache_extra=f'q:{query.lower()}')
+            if filters.active:
+                allowed = set(
+                    filter_queryset(filters).filter(pk__in=product_ids).values_list('id', flat=True)
+                )
+                product_ids = [pk for pk in product_ids if pk in allowed]
+            paginator = Paginator(product_ids, 12)
+            page_obj = paginator.get_page(request.GET.get('page'))
+            # Загружаем только продукты страницы - одним пакетом из кэша
+            page_obj.object_list = load_products(page_obj.object_list)
+        else:
+            counts = facet_counts(filters)
+            page_obj = paginate_products(
+                request, 12, order=request.GET.get('sort'), count=counts['total'],
+                queryset=filter_queryset(filters), loader=load_products,
+            )
 
         context = {
             'title': f'Результаты поиска: {query}',
             'products': page_obj,
             'page_obj': page_obj,
             'query': query,
-            'category_slug': category_slug,
+            'filters': filters,
+            'facets': build_facets(filters, counts, base_query=urlencode({'q': query}) if query else ''),
+            'page_query': _product_list_query('', filters),
         }
         return render(request, 'catalog/search_results.html', context)
 
     return redirect('catalog:product_list')
 
 
+def autocomplete(request):
+    """Подсказки для строки поиска (JSON, вызывается на каждое нажатие клавиши)"""
+    prefix = normalize_prefix(request.GET.get('q', ''))
+    min_length = getattr(settings, 'CATALOG_AUTOCOMPLETE', {}).get('MIN_LENGTH', 3)
+    if len(prefix) < min_length:
+        return JsonResponse({'query': prefix, 'products': [], 'categories': []})
+
+    suggestions = cache_manager.get_suggestions(prefix)
+    response = JsonResponse({
+        'query': prefix,
+        'products': [
+            {'id': pk, 'name': name, 'url': reverse('catalog:product_detail', args=[pk])}
+            for pk, name in suggestions['products']
+        ],
+        'categories': [
+            {'slug': slug, 'name': name, 'url': reverse('catalog:category_products', args=[slug])}
+            for slug, name in suggestions['categories']
+        ],
+    })
+    # Браузер не повторяет запрос при возврате к тому же префиксу
+    response['Cache-Control'] = 'max-age=60'
+    return response
+
+
 # Статистика и отчеты
 @login_required
 def statistics_view(request):
@@ -466,6 +527,7 @@ def statistics_view(request):
         'title': 'Статистика магазина',
         'overall_stats': stats.get('overall', {}),
         'popular_categories': stats.get('categories', []),
+        'snapshot': stats.get('snapshot'),
         'from_cache': 'timestamp' in stats,
     }
     return render(request, 'catalog/statistics.html', context)
@@ -488,34 +550,43 @@ def get_cached_product_list():
 
 
 # Дополнительная функция для проверки работы кэша
-@login_required
+@staff_member_required
 def cache_debug(request):
-    """Страница отладки кэша"""
+    """
+    Состояние кэша каталога в JSON (только для персонала).
+    Ничего не читает через геттеры, поэтому сам кэш не заполняет.
+    """
     from django.core.cache import cache as django_cache
 
-    # Создаем ключи вручную (так как знаем шаблоны)
-    cache_keys = {
-        'products_all': 'products:all',
-        'categories_all': 'categories:all',
-        'product_stats': 'products:stats',
-    }
-
-    cache_info = {}
-    for key_name, key_template in cache_keys.items():
-        cache_info[f'{key_name}_in_cache'] = bool(django_cache.get(key_template))
-
-    # Тестируем работу кэша
-    test_results = {
-        'products_count': len(list(cache_manager.get_products())),
-        'categories_count': len(list(cache_manager.get_categories())),
-        'stats_loaded': 'timestamp' in cache_manager.get_stats(),
-    }
-
-    context = {
-        'title': 'Отладка кэша',
-        'cache_info': cache_info,
-        'test_results': test_results,
-        'cache_enabled': getattr(settings, 'CACHE_ENABLED', True),
-    }
+    # Ключи без параметров проверяем по реальным именам (с поколениями и префиксом)
+    keys = {}
+    for key_name in ('products_all', 'categories_all', 'product_stats'):
+        key = CatalogCache._key(key_name)
+        keys[key_name] = {
+            'key': django_cache.make_key(key),
+            'in_cache': django_cache.has_key(key),
+        }
 
-    return render(request, 'catalog/cache_debug.html', context)
\ No newline at end of file
+    report = CatalogCache.report()
+    report['keys'] = keys
+    report['cache_enabled'] = getattr(settings, 'CACHE_ENABLED', True)
+    return JsonResponse(report)
+
+
+@staff_member_required
+def export_catalog(request):
+    """
+    Выгрузка всех продуктов (только для персонала):
+    ?format=csv|jsonl, ?gzip=1 - сжатие на лету, ?published=1 - только опубликованные.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CatalogExport.FORMATS:
+        return JsonResponse({'error': f'format: одно из {", ".join(CatalogExport.FORMATS)}'}, status=400)
+
+    export = CatalogExport(
+        fmt, compress=request.GET.get('gzip') == '1',
+        published_only=request.GET.get('published') == '1',
+    )
+    response = StreamingHttpResponse(export, content_type=export.content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    return response
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.views.generic import ListView
 from django.shortcuts import render, get_object_or_404
+from .cache import CatalogCache
 from .models import Product, Category
+from .pagination import KeysetPaginator, PRODUCT_ORDERING
 from .services import get_products_by_category, get_categories_with_counts
 
 
@@ -18,6 +21,17 @@ class CategoryProductsView(ListView):
         category_slug = self.kwargs.get('category_slug')
         return get_products_by_category(category_slug)
 
+    def paginate_queryset(self, queryset, page_size):
+        """Пагинация по курсору (?cursor=) вместо OFFSET + COUNT(*)"""
+        if getattr(settings, 'CATALOG_PAGINATION', 'keyset') != 'keyset':
+            return super().paginate_queryset(queryset, page_size)
+        # Страница - карточки из кэша (get_products_info), а не полные строки Product
+        paginator = KeysetPaginator(
+            queryset, page_size, PRODUCT_ORDERING, loader=CatalogCache.get_products_info,
+        )
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return None, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, **kwargs):
         """Добавляем информацию о категории в контекст"""
         context = super().get_context_data(**kwargs)
@@ -31,7 +45,16 @@ class CategoryProductsView(ListView):
             context['title'] = 'Все товары'
 
         context['categories'] = get_categories_with_counts()
-        context['products_count'] = context['products'].count()
+        page = context['page_obj']
+        if page.paginator is not None:
+            context['products_count'] = page.paginator.count
+        else:
+            # Количество из кэша, а не COUNT(*) на каждой странице
+            info = CatalogCache.get_category_info(category_slug) if category_slug else None
+            context['products_count'] = (
+                info['stats']['count'] if info else CatalogCache.get_stats()['overall']['total']
+            )
+        context['products'] = page
 
         return context
 
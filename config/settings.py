@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.CatalogCacheMemoMiddleware',  # Мемоизация CatalogCache в запросе
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -158,6 +159,73 @@ LOGOUT_REDIRECT_URL = '/'
 # 🆕 Включение/выключение кэширования (для отладки)
 CACHE_ENABLED = True
 
+# Режим хранения списков каталога в кэше:
+# 'ids'  - только ID, при попадании выполняется запрос id__in
+# 'rows' - компактные кортежи колонок, попадание не обращается к БД
+CATALOG_CACHE_MODE = 'rows'
+
+# Сколько секунд после истечения TTL отдавать устаревшее значение,
+# пока один воркер пересчитывает его под блокировкой
+CATALOG_CACHE_STALE_TTL = 300
+
+# Вероятностное раннее обновление ключей до истечения TTL (0 - выключено)
+CATALOG_CACHE_EARLY_REFRESH_BETA = 0
+
+# Значения каталога больше этого размера (байт) сжимаются zlib (0 - не сжимать)
+CATALOG_CACHE_COMPRESS_THRESHOLD = 1024
+
+# Пагинация списков продуктов:
+# 'keyset' - курсор по (-created_at, name, id), каждая страница стоит одинаково
+# 'offset' - обычный Paginator с номерами страниц
+CATALOG_PAGINATION = 'keyset'
+
+# Бэкенд поиска продуктов и максимум результатов одного запроса:
+# 'catalog.search.PostgresSearchBackend'          - полнотекстовый поиск PostgreSQL
+# 'catalog.search_engine.InMemorySearchBackend'   - индекс BM25 в памяти процесса
+# 'catalog.search.SimpleSearchBackend'            - icontains средствами ORM
+# PostgresSearchBackend на другой СУБД заменяется индексом в памяти
+CATALOG_SEARCH_BACKEND = 'catalog.search.PostgresSearchBackend'
+CATALOG_SEARCH_LIMIT = 500
+
+# Статистика каталога читается из снимка (refresh_catalog_stats).
+# Если снимок не проверялся дольше этого времени (с), он обновляется при чтении
+CATALOG_STATS_MAX_AGE = 600
+
+# Границы диапазонов цены для фасетов (руб.): 0-500, 500-1000, ..., от 50000
+CATALOG_PRICE_BUCKETS = (0, 500, 1000, 5000, 10000, 50000)
+
+# Время жизни HTML-фрагментов карточек продуктов в списках (с)
+CATALOG_CARD_CACHE_TTL = 3600
+
+# Кэш готовых страниц каталога для анонимных посетителей (заголовок X-Cache)
+CATALOG_PAGE_CACHE = True
+
+# JSON API каталога (/api/...): размер страницы по умолчанию и максимум,
+# ID в пакетном запросе ?ids=, размер пачки серверного курсора
+CATALOG_API = {
+    'DEFAULT_LIMIT': 50,
+    'MAX_LIMIT': 1000,
+    'MAX_IDS': 200,
+    'CHUNK_SIZE': 500,
+}
+
+# Автодополнение: минимальная и максимальная длина префикса, число подсказок.
+# Триграммный индекс pg_trgm не помогает ILIKE короче 3 символов
+CATALOG_AUTOCOMPLETE = {
+    'MIN_LENGTH': 3,
+    'MAX_LENGTH': 64,
+    'LIMIT': 8,
+}
+
+# Процессный LRU-кэш (L1) перед Redis для редко меняющихся ключей.
+# Другие воркеры узнают об инвалидации через Redis pub/sub.
+# None - выключен
+CATALOG_CACHE_L1 = {
+    'MAX_SIZE': 256,   # записей на процесс
+    'TTL': 60,         # секунд
+    'KEYS': ['categories_all', 'category_detail', 'product_stats'],
+}
+
 # Настройки Redis для кэширования
 CACHES = {
     "default": {